@@ -0,0 +1,106 @@
+"""
+Start up benchmark of tower.py, the cli is run with python -X importtime and the import times are summed up.
+Fails (exit code 1) if the start up is over budget or if a heavy module is loaded by a command which does not
+need it, use it in CI to keep the cli fast.
+
+The heavy modules are kept out of printing the help, rejecting the arguments and forwarding a command to a running
+daemon. A command which the cli runs by itself, such as --resource organizations x without a daemon, talks to
+Ansible AWX and loads requests and urllib3 on purpose, measure it with --allow-heavy.
+
+python startup_bench.py --budget-ms 25
+python startup_bench.py --budget-ms 25 -- -u admin --host 127.0.0.1 --pass --type unknown
+python startup_bench.py --allow-heavy --budget-ms 150 -- -u admin --host 127.0.0.1 --pass --no-daemon --resource x y
+"""
+from argparse import ArgumentParser
+from typing import Dict, List, Tuple
+import os
+import subprocess
+import sys
+import time
+
+# These modules must never be loaded just to print the help or to reject the arguments.
+HEAVY_MODULES = ("requests", "urllib3", "paramiko", "tqdm", "cryptography")
+
+TOWER_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tower.py")
+
+
+def run_importtime(cli_args: List[str]) -> Tuple[float, str]:
+    """
+    Run the cli once with -X importtime.
+    :return:
+        wall time in seconds and the import time report which is written to stderr.
+    """
+    env = dict(os.environ)
+    # helper is imported from the root of the repository.
+    root = os.path.dirname(os.path.dirname(TOWER_CLI))
+    env["PYTHONPATH"] = root + (os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else "")
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", TOWER_CLI, *cli_args],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               env=env, universal_newlines=True)
+    return time.perf_counter() - start, completed.stderr
+
+
+def parse_importtime(report: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parse the lines of "import time: self [us] | cumulative | imported package".
+    :return:
+        dictionary of module name to (self us, cumulative us), only the top level imports have no indentation.
+    """
+    modules = dict()
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # one space follows the separator, the deeper imports are indented further.
+        modules[name.rstrip()[1:]] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Measure the start up time of tower.py.")
+    parser.add_argument("--budget-ms", type=float, dest="budget_ms", default=25,
+                        help="Maximum total import time in milliseconds.")
+    parser.add_argument("--runs", type=int, dest="runs", default=5)
+    parser.add_argument("--top", type=int, dest="top", default=10)
+    parser.add_argument("--allow-heavy", action="store_true", dest="allow_heavy",
+                        help="Only check the budget, for the commands which talk to Ansible AWX without a daemon.")
+    parser.add_argument("cli_args", nargs="*", help="Arguments of tower.py, default is --help.")
+    args = parser.parse_args()
+    cli_args = args.cli_args if args.cli_args else ["--help"]
+
+    wall_times = list()
+    import_times = list()
+    modules = dict()
+    for _ in range(args.runs):
+        wall_time, report = run_importtime(cli_args)
+        modules = parse_importtime(report)
+        wall_times.append(wall_time)
+        # top level imports are the names without leading spaces, their cumulative time includes the children.
+        # site is imported by the interpreter before tower.py runs, it is reported but not part of the budget.
+        import_times.append(sum(cumulative for name, (_, cumulative) in modules.items()
+                                if not name.startswith(" ") and name != "site") / 1000)
+    import_ms = min(import_times)
+    print(f"tower.py {' '.join(cli_args)}")
+    print(f"wall time: best {min(wall_times) * 1000:.1f} ms, worst {max(wall_times) * 1000:.1f} ms "
+          f"over {args.runs} runs")
+    print(f"import time without site: {import_ms:.1f} ms, budget {args.budget_ms:.1f} ms")
+    print(f"top {args.top} imports by cumulative time:")
+    for name, (_, cumulative) in sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:10.1f} ms  {name.strip()}")
+
+    loaded = sorted(module for module in HEAVY_MODULES if module in {name.strip() for name in modules})
+    failed = False
+    if loaded and args.allow_heavy:
+        print(f"heavy modules loaded: {', '.join(loaded)}")
+    elif loaded:
+        print(f"FAIL: heavy modules loaded: {', '.join(loaded)}")
+        failed = True
+    if import_ms > args.budget_ms:
+        print("FAIL: import time is over budget.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
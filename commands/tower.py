@@ -2,88 +2,296 @@
 An attempt to construct a cli module for ansible tower/awx.
 I would need a filter in the command line in order to get useful information from json.
 Currently I am building it up bit by bit.
+
+The cli is called thousands of times from cron and shell loops, so only the standard library is loaded at start up.
+helper.awx_api, which loads requests and urllib3, is imported only when a subcommand is run here and not forwarded
+to a daemon, so the help, argument errors and every command forwarded to a running daemon stay light.
+See startup_bench.py for the import time budget.
 """
-from helper.awx_api import Tower
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
 from getpass import getpass
+from typing import Any, Callable, Dict, List, Optional, TextIO
+import os
 import sys
 
-parser = ArgumentParser(description="This is a script that helps in operating Ansible AWX.",
-                        usage="python tower.py -u username --host 192.168.1.100 --resource projects lab -p")
-parser.add_argument("-u", "--user", type=str, dest="username", required=True)
-parser.add_argument("-p", "--pass", dest="password", required=True, action="store_true")
-parser.add_argument("--host", type=str, dest="server_addr", required=True)
-parser.add_argument("--port", type=int, dest="server_port")
-parser.add_argument("--verifyssl", action="store_true", dest="verify_ssl")
-
-# never use type=list if you are expecting more than one args, it will make your strings into list of chars.
-parser.add_argument("--resource",
-                    nargs="+",
-                    dest="resource_info",
-                    help="Resource type and name")
-parser.add_argument("--create", action="store_true", dest="create")
-parser.add_argument("--type", type=str, dest="type")
-parser.add_argument("--name", type=str, dest="name")
-parser.add_argument("--desc", type=str, dest="desc")
-parser.add_argument("--max-hosts", type=int, dest="max_hosts")
-parser.add_argument("--del", action="store_true", dest="delete")
-
-args = parser.parse_args()
-
-if len(sys.argv) == 1:
-    parser.print_help(sys.stderr)
-    sys.exit(1)
-if args.password:
-    password = getpass()
+
+NOT_IMPLEMENTED = "--resource arguments insufficient, or the resource is currently not implemented in this version."
+
+
+def build_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="This is a script that helps in operating Ansible AWX.",
+                            usage="python tower.py -u username --host 192.168.1.100 --resource projects lab -p")
+    parser.add_argument("-u", "--user", type=str, dest="username", required=True)
+    parser.add_argument("-p", "--pass", dest="password", required=True, action="store_true")
+    parser.add_argument("--host", type=str, dest="server_addr", required=True)
+    parser.add_argument("--port", type=int, dest="server_port")
+    parser.add_argument("--verifyssl", action="store_true", dest="verify_ssl")
+
+    # never use type=list if you are expecting more than one args, it will make your strings into list of chars.
+    parser.add_argument("--resource",
+                        nargs="+",
+                        dest="resource_info",
+                        help="Resource type and name")
+    parser.add_argument("--create", action="store_true", dest="create")
+    parser.add_argument("--type", type=str, dest="type")
+    parser.add_argument("--name", type=str, dest="name")
+    parser.add_argument("--desc", type=str, dest="desc")
+    parser.add_argument("--max-hosts", type=int, dest="max_hosts")
+    parser.add_argument("--del", action="store_true", dest="delete")
+    parser.add_argument("--batch", type=str, dest="batch",
+                        help="NDJSON file of operations, - for stdin. See helper/awx_batch.py for the format.")
+    parser.add_argument("--concurrency", type=int, dest="concurrency", default=8,
+                        help="Number of batch operations running concurrently.")
+    parser.add_argument("--list", type=str, dest="list_resource",
+                        help="List every object of a resource as NDJSON, such as hosts or inventories/1/hosts.")
+    parser.add_argument("--filter", action="append", dest="filters", default=[],
+                        help="Filter of --list in key=value, such as name__startswith=web, can be repeated.")
+    parser.add_argument("--order-by", type=str, dest="order_by",
+                        help="Ordering of --list, use --order-by=-modified for descending.")
+    parser.add_argument("--fields", type=str, dest="fields",
+                        help="Comma separated fields printed by --list, such as id,name,summary_fields.inventory.name")
+    parser.add_argument("--page-size", type=int, dest="page_size", default=200)
+    parser.add_argument("--deadline", type=float, dest="deadline",
+                        help="Seconds the command has, lookups included, a batch gives them to each operation.")
+    parser.add_argument("--cache", action="store_true", dest="disk_cache",
+                        help="Keep the scheme and the name to id lookups on disk for the next runs. An id is checked "
+                             "on its first use by each run, then trusted for 60 seconds.")
+    parser.add_argument("--daemon", action="store_true", dest="daemon",
+                        help="Keep a warm session on a unix socket, the cli forwards its commands to it.")
+    parser.add_argument("--warmup", action="store_true", dest="warmup",
+                        help="Fill the lookup caches of the daemon when it starts.")
+    parser.add_argument("--idle-timeout", type=int, dest="idle_timeout", default=900,
+                        help="Seconds without any command before the daemon exits, 0 never exits.")
+    parser.add_argument("--stop-daemon", action="store_true", dest="stop_daemon")
+    parser.add_argument("--no-daemon", action="store_true", dest="no_daemon",
+                        help="Run the command directly even if a daemon is running.")
+    return parser
+
+
+def get_tower(args: Namespace, password: str):
+    # requests and urllib3 are loaded here, only when Ansible AWX is really called.
+    from helper.awx_api import Tower
+
     tower_config = dict(
         username=args.username,
         password=password,
         server_addr=args.server_addr,
         server_port=args.server_port if args.server_port else 8052,
-        verify_ssl=True if args.verify_ssl else False
+        verify_ssl=True if args.verify_ssl else False,
+        disk_cache=args.disk_cache
     )
-    tower = Tower(**tower_config)
+    return Tower(**tower_config)
+
+
+def resource_info(tower, args: Namespace, stdin: TextIO, stdout: TextIO) -> int:
+    # if --resource is used check if there are two arguments.
+    resource = args.resource_info[0]
+    name = args.resource_info[1]
+    resource_id = tower.find_resource_id(resource=resource, name=name)
+    if resource_id.get("found"):
+        r = tower.get_resource_info(resource=resource, resource_id=resource_id.get("result"))
+        print(r.json(), file=stdout)
+        return 0
+    print(resource_id, file=stdout)
+    return 1
+
 
-    if args.resource_info and len(args.resource_info) == 2:
-        # if --resource is used check if there are two arguments.
-        resource = args.resource_info[0]
-        name = args.resource_info[1]
-        resource_id = tower.find_resource_id(resource=resource, name=name)
+def organizations(tower, args: Namespace, stdin: TextIO, stdout: TextIO) -> int:
+    if args.create:
+        payload = dict(
+            name=args.name,
+            desc=args.desc if args.desc else "",
+            max_hosts=args.max_hosts if args.max_hosts else 0
+        )
+        print(tower.create_org(**payload), file=stdout)
+    elif args.delete:
+        resource_id = tower.find_resource_id(resource=args.type.lower(),
+                                             name=args.name)
         if resource_id.get("found"):
-            r = tower.get_resource_info(resource=resource, resource_id=resource_id.get("result"))
-            print(r.json())
+            r = tower.delete_request(resource_id=resource_id.get("result"),
+                                     resource=args.type.lower())
+            print(r, file=stdout)
         else:
-            print(resource_id)
-            sys.exit(1)
-    elif args.type.lower() == "organizations":
-        if args.create:
-            payload = dict(
-                name=args.name,
-                desc=args.desc if args.desc else "",
-                max_hosts=args.max_hosts if args.max_hosts else 0
-            )
-            print(tower.create_org(**payload))
-        elif args.delete:
-            resource_id = tower.find_resource_id(resource=args.type.lower(),
-                                                 name=args.name)
-            if resource_id.get("found"):
-                r = tower.delete_request(resource_id=resource_id.get("result"),
-                                         resource=args.type.lower())
-                print(r)
-            else:
-                print(resource_id)
-        else:
-            resource_id = tower.find_resource_id(resource=args.type.lower(),
-                                                 name=args.name)
-            if resource_id.get("found"):
-                r = tower.get_resource_info(resource=args.type.lower(),
-                                            resource_id=resource_id.get("result"))
-                print(r.json())
-            else:
-                print(resource_id)
+            print(resource_id, file=stdout)
     else:
-        print("--resource arguments insufficient, or the resource is currently not implemented in this version.")
-        sys.exit(1)
-else:
-    print("Password is incorrect or not supplied.")
-    sys.exit(1)
+        resource_id = tower.find_resource_id(resource=args.type.lower(),
+                                             name=args.name)
+        if resource_id.get("found"):
+            r = tower.get_resource_info(resource=args.type.lower(),
+                                        resource_id=resource_id.get("result"))
+            print(r.json(), file=stdout)
+        else:
+            print(resource_id, file=stdout)
+    return 0
+
+
+def batch(tower, args: Namespace, stdin: TextIO, stdout: TextIO) -> int:
+    from helper.awx_batch import run_batch
+    import json
+
+    failed = 0
+    source = stdin if args.batch == "-" else open(args.batch, "r")
+    try:
+        for result in run_batch(tower, source, max_workers=args.concurrency, deadline=args.deadline):
+            failed += result["status"] != "success"
+            # one line per operation as soon as it is done, so the output can be piped.
+            print(json.dumps(result), file=stdout, flush=True)
+    finally:
+        if source is not stdin:
+            source.close()
+    return 1 if failed else 0
+
+
+def pick_fields(obj: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """
+    Keep only the fields, a dotted field such as summary_fields.inventory.name goes into the nested objects.
+    """
+    picked = dict()
+    for field in fields:
+        value = obj
+        for key in field.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        picked[field] = value
+    return picked
+
+
+def list_resource(tower, args: Namespace, stdin: TextIO, stdout: TextIO) -> int:
+    import json
+
+    params = dict()
+    for query in args.filters:
+        key, separator, value = query.partition("=")
+        if not separator:
+            print(f"--filter {query} is not in key=value.", file=stdout)
+            return 1
+        params[key] = value
+    if args.order_by:
+        params["order_by"] = args.order_by
+    fields = args.fields.split(",") if args.fields else None
+    for response in tower.iter_pages(f"/v2/{args.list_resource.strip('/')}/", params=params,
+                                     page_size=args.page_size):
+        if response["status"] != 200 or not isinstance(response["response"], dict):
+            print(json.dumps({"status": "failed", "status_code": response["status"],
+                              "message": response["response"]}), file=stdout)
+            return 1
+        lines = [json.dumps(pick_fields(obj, fields) if fields else obj)
+                 for obj in response["response"].get("results", [])]
+        if lines:
+            # flushed every page, jq starts at the first page instead of the last.
+            stdout.write("\n".join(lines) + "\n")
+            stdout.flush()
+    return 0
+
+
+def select_handler(args: Namespace) -> Optional[Callable[[Any, Namespace, TextIO, TextIO], int]]:
+    if args.batch:
+        return batch
+    elif args.list_resource:
+        return list_resource
+    elif args.resource_info and len(args.resource_info) == 2:
+        return resource_info
+    elif args.type and args.type.lower() == "organizations":
+        return organizations
+    return None
+
+
+def run_handler(handler: Callable[[Any, Namespace, TextIO, TextIO], int], tower, args: Namespace,
+                stdin: TextIO, stdout: TextIO) -> int:
+    """
+    Run the command within --deadline, the batch gives the deadline to each of its operations instead.
+    """
+    from helper.deadline import Deadline, DeadlineExceeded
+    import json
+
+    try:
+        with Deadline(None if args.batch else args.deadline):
+            return handler(tower, args, stdin, stdout)
+    except DeadlineExceeded as e:
+        print(json.dumps(e.to_dict()), file=stdout)
+        return 1
+
+
+def daemon(args: Namespace, password: str) -> int:
+    """
+    Keep the session, the token and the id cache warm and run the commands forwarded by the cli.
+    """
+    from helper.awx_daemon import serve
+
+    tower = get_tower(args, password)
+    # the daemon serves several cli at the same time, each of them can run a batch.
+    tower.open_session(pool_maxsize=max(args.concurrency, 16), token=True)
+    if args.warmup:
+        report = tower.warmup()
+        timings = ", ".join(f"{resource} {r['count']} in {r['elapsed']:.2f}s"
+                            for resource, r in report["resources"].items())
+        print(f"warmup {report['status']} in {report['elapsed']:.2f}s: {timings}", file=sys.stderr)
+
+    def dispatch(argv: List[str], stdin: TextIO, stdout: TextIO) -> int:
+        command_args = build_parser().parse_args(argv)
+        handler = select_handler(command_args)
+        if handler is None:
+            print(NOT_IMPLEMENTED, file=stdout)
+            return 1
+        return run_handler(handler, tower, command_args, stdin, stdout)
+
+    try:
+        return serve(daemon_socket(args), dispatch, idle_timeout=args.idle_timeout)
+    finally:
+        tower.close_session()
+
+
+def daemon_socket(args: Namespace) -> str:
+    from helper.awx_daemon import socket_path
+
+    return socket_path(args.username, args.server_addr, args.server_port if args.server_port else 8052)
+
+
+def main(argv: List[str] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    if len(argv) == 0:
+        parser.print_help(sys.stderr)
+        return 1
+    args = parser.parse_args(argv)
+    if not args.password:
+        print("Password is incorrect or not supplied.")
+        return 1
+    if args.stop_daemon:
+        from helper.awx_daemon import stop
+
+        return 0 if stop(daemon_socket(args)) else 1
+    # TOWER_PASSWORD is for cron and batches read from stdin, where there is no terminal to prompt.
+    if args.daemon:
+        return daemon(args, os.environ.get("TOWER_PASSWORD") or getpass())
+    # Choose the subcommand before asking for the password and before loading helper.awx_api.
+    handler = select_handler(args)
+    if handler is None:
+        print(NOT_IMPLEMENTED)
+        return 1
+    if not args.no_daemon:
+        from helper.awx_daemon import forward
+
+        # the daemon does not share the working directory of the cli, so a batch file is sent as stdin.
+        if args.batch and args.batch != "-":
+            with open(args.batch, "r") as source:
+                rc = forward(daemon_socket(args), argv + ["--batch", "-"], stdin=source)
+        else:
+            rc = forward(daemon_socket(args), argv, stdin=sys.stdin if args.batch == "-" else None)
+        if rc is not None:
+            return rc
+    password = os.environ.get("TOWER_PASSWORD") or getpass()
+    tower = get_tower(args, password)
+    # one session, so the scheme is probed once and the connections are reused across the requests.
+    tower.open_session(pool_maxsize=args.concurrency)
+    try:
+        return run_handler(handler, tower, args, sys.stdin, sys.stdout)
+    except BrokenPipeError:
+        # the reader of the pipe has exited, such as head, nothing more to print.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        tower.close_session()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
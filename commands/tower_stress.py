@@ -0,0 +1,264 @@
+"""
+Stress tool of a shared Tower instance, one Tower is used by 1 to 64 threads against a local stand-in of Ansible AWX.
+Every result is checked, the throughput of each number of threads is compared with one thread, and the tokens
+expire while the threads are running so the token refresh is exercised.
+Fails (exit code 1) if any result is wrong, any call raises, too many tokens are created or the throughput
+does not scale.
+
+python tower_stress.py
+python tower_stress.py --threads 1 4 16 64 --seconds 3 --latency 0.01 --token-ttl 0.5 --min-scaling 4
+"""
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock, Event
+from typing import Any, Dict
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import random
+import re
+import sys
+import time
+
+# helper is imported from the root of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.awx_api import Tower  # noqa: E402
+
+RESOURCES = ("organizations", "inventories", "projects", "credentials", "job_templates")
+
+# Objects per resource, they all fit in the first page like a small lab AWX.
+OBJECTS = 20
+
+
+class StandIn:
+    """
+    The state of the stand-in server: the objects, the tokens and the counters.
+    """
+    def __init__(self, latency: float, token_ttl: float):
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.lock = Lock()
+        self.tokens = dict()
+        self.tokens_issued = 0
+        self.requests = 0
+        self.unauthorized = 0
+        self.objects = {
+            resource: [
+                {
+                    "id": index,
+                    "type": resource[:-1],
+                    "name": f"{resource}-{index}",
+                    "modified": "2020-03-01T00:00:00Z",
+                    "summary_fields": {"organization": {"id": index, "name": f"organizations-{index}"}}
+                }
+                for index in range(1, OBJECTS + 1)
+            ]
+            for resource in RESOURCES
+        }
+
+    def authorized(self, header: str) -> bool:
+        if header is None:
+            return False
+        if header.startswith("Basic "):
+            return True
+        with self.lock:
+            issued = self.tokens.get(header[len("Bearer "):])
+        # every token expires token_ttl seconds after it is issued.
+        return issued is not None and time.monotonic() - issued < self.token_ttl
+
+    def issue_token(self) -> Dict[str, Any]:
+        with self.lock:
+            self.tokens_issued += 1
+            token = f"token-{self.tokens_issued}"
+            self.tokens[token] = time.monotonic()
+            return {"id": self.tokens_issued, "token": token}
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # backlog of the listening socket, 64 threads connect at the same moment. It is read by listen() in the
+    # constructor, so it must be set on the class.
+    request_queue_size = 256
+
+
+def make_handler(state: StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body are written separately, without this every response waits for the delayed ack.
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, code: int, body: Any = None):
+            data = json.dumps(body).encode("utf-8") if body is not None else b""
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def begin(self) -> bool:
+            with state.lock:
+                state.requests += 1
+            if state.latency:
+                time.sleep(state.latency)
+            length = int(self.headers.get("Content-Length", 0))
+            if length:
+                self.rfile.read(length)
+            if self.path.rstrip("/") == "/api":
+                return True
+            if not state.authorized(self.headers.get("Authorization")):
+                with state.lock:
+                    state.unauthorized += 1
+                self.send(401, {"detail": "Authentication credentials were not provided."})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self.begin():
+                return
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path.rstrip("/") == "/api":
+                return self.send(200, {})
+            match = re.match(r"^/api/v2/(\w+)/(\d+)/?$", url.path)
+            if match and match.group(1) in state.objects:
+                objects = state.objects[match.group(1)]
+                index = int(match.group(2))
+                if 1 <= index <= len(objects):
+                    return self.send(200, objects[index - 1])
+                return self.send(404, {"detail": "Not found."})
+            match = re.match(r"^/api/v2/(\w+)/?$", url.path)
+            if match and match.group(1) in state.objects:
+                objects = state.objects[match.group(1)]
+                if "name" in query:
+                    objects = [obj for obj in objects if obj["name"] == query["name"][0]]
+                return self.send(200, {"count": len(objects), "next": None, "results": objects})
+            self.send(404, {"detail": "Not found."})
+
+        def do_POST(self):
+            if not self.begin():
+                return
+            if self.path == "/api/v2/tokens/":
+                return self.send(201, state.issue_token())
+            self.send(404, {"detail": "Not found."})
+
+        def do_DELETE(self):
+            if not self.begin():
+                return
+            self.send(204)
+
+    return Handler
+
+
+def worker(tower: Tower, stop: Event, results: Dict[str, Any], lock: Lock):
+    """
+    Mixed lookups, every answer is checked against the stand-in objects.
+    """
+    ops = 0
+    wrong = list()
+    rng = random.Random()
+    is_https_status, base_url = tower.get_api_url()
+    while not stop.is_set():
+        resource = rng.choice(RESOURCES)
+        index = rng.randint(1, OBJECTS)
+        name = f"{resource}-{index}"
+        kind = rng.randrange(3)
+        try:
+            if kind == 0:
+                response = tower.find_resource_id(resource=resource, name=name)
+                ok = response.get("found") and response.get("result") == index
+            elif kind == 1:
+                response = tower.get_request(f"{base_url}/v2/{resource}/{index}/", is_https_status)
+                ok = response["status"] == 200 and response["response"]["name"] == name
+            else:
+                response = tower.resolve_name(resource, index)
+                ok = response == name
+        except Exception as e:
+            ok = False
+            response = f"{type(e).__name__}: {e}"
+        ops += 1
+        if not ok:
+            wrong.append({"op": kind, "name": name, "response": str(response)[:200]})
+    with lock:
+        results["ops"] += ops
+        results["wrong"].extend(wrong)
+
+
+def run_level(server_port: int, threads: int, seconds: float) -> Dict[str, Any]:
+    tower = Tower(username="admin", password="password", server_addr="127.0.0.1", server_port=server_port)
+    # one http session per thread at most, a request never waits for a session.
+    tower.open_session(pool_maxsize=threads, token=True)
+    stop = Event()
+    lock = Lock()
+    results = {"ops": 0, "wrong": list()}
+    workers = [Thread(target=worker, args=(tower, stop, results, lock)) for _ in range(threads)]
+    start = time.monotonic()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - start
+    stats = tower.request_stats()
+    tower.close_session()
+    return {
+        "threads": threads,
+        "ops": results["ops"],
+        "ops_per_sec": results["ops"] / elapsed,
+        "wrong": results["wrong"],
+        "coalesced": stats["coalesced"]
+    }
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Stress a shared Tower instance against a local stand-in of Ansible AWX.")
+    parser.add_argument("--threads", type=int, nargs="+", dest="threads", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--seconds", type=float, dest="seconds", default=2.0, help="Duration of each level.")
+    parser.add_argument("--latency", type=float, dest="latency", default=0.01,
+                        help="Seconds the stand-in takes to answer each request.")
+    parser.add_argument("--token-ttl", type=float, dest="token_ttl", default=0.5,
+                        help="Seconds before a token expires, the threads must refresh it once, together.")
+    parser.add_argument("--min-scaling", type=float, dest="min_scaling", default=4.0,
+                        help="Minimum throughput of the largest number of threads compared with the smallest.")
+    args = parser.parse_args()
+
+    state = StandIn(latency=args.latency, token_ttl=args.token_ttl)
+    server = StandInServer(("127.0.0.1", 0), make_handler(state))
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    levels = list()
+    failed = False
+    for threads in sorted(set(args.threads)):
+        issued_before = state.tokens_issued
+        level = run_level(server.server_address[1], threads, args.seconds)
+        level["tokens"] = state.tokens_issued - issued_before
+        levels.append(level)
+        print(f"{threads:3d} threads: {level['ops']:7d} ops {level['ops_per_sec']:9.1f} ops/s "
+              f"{len(level['wrong']):4d} wrong {level['coalesced']:6d} coalesced {level['tokens']:3d} tokens")
+        if level["wrong"]:
+            failed = True
+            for wrong in level["wrong"][:5]:
+                print(f"    wrong: {wrong}")
+        # one token at open_session, then one per expiry, however many threads get 401 at the same moment.
+        max_tokens = 1 + int(args.seconds / args.token_ttl) + 1
+        if level["tokens"] > max_tokens:
+            print(f"    FAIL: {level['tokens']} tokens created, at most {max_tokens} expected, "
+                  f"the token refresh is not atomic.")
+            failed = True
+    server.shutdown()
+
+    scaling = levels[-1]["ops_per_sec"] / levels[0]["ops_per_sec"] if levels[0]["ops_per_sec"] else 0
+    print(f"scaling {levels[0]['threads']} -> {levels[-1]['threads']} threads: {scaling:.1f}x, "
+          f"{state.requests} requests, {state.unauthorized} unauthorized")
+    if len(levels) > 1 and scaling < args.min_scaling:
+        print(f"FAIL: scaling is below {args.min_scaling}x.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
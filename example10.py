@@ -0,0 +1,26 @@
+from helper.awx_api import Tower
+from getpass import getpass
+from pprint import pprint
+
+# Get the password from user.
+password = getpass()
+
+# Ansible Tower/AWX minimum configuration
+tower_config = {
+    "username": "admin",
+    "password": password,
+    "server_addr": "192.168.100.174"
+}
+
+tower = Tower(**tower_config)
+# create a job template which is sliced into 3 jobs.
+tower.create_job_template(name="acl_sliced",
+                          project_id="dev_project",
+                          inv_id="cisco_asa",
+                          playbook="asa_acl.yml",
+                          job_slice_count=3)
+
+# the launch returns the parent workflow job, every slice job is followed until all of them are finished.
+r = tower.job_launch_follow(job_id="acl_sliced", extra_vars={"acl_name": "ansible_push"})
+print(r.get("workflow_job"), r.get("job_status"), r.get("elapsed"))
+pprint(r.get("summary"))
@@ -0,0 +1,26 @@
+from helper.awx_api import Tower
+from getpass import getpass
+
+# Get the password from user.
+password = getpass()
+
+# Ansible Tower/AWX minimum configuration
+tower_config = {
+    "username": "admin",
+    "password": password,
+    "server_addr": "192.168.100.174"
+}
+
+tower = Tower(**tower_config)
+# The same quick check on two inventories, no job template or project is required.
+commands = [
+    dict(inv_id="firewalls", module_name="ping", credential="fw03"),
+    dict(inv_id="linux_servers", module_name="command", module_args="uptime", credential="centos", forks=20)
+]
+# The events are printed as soon as they arrive, the last item of each command has the status.
+for item in tower.ad_hoc_command_stream(commands=commands):
+    if "event" in item:
+        event = item["event"]
+        print(commands[item["index"]]["inv_id"], event.get("host_name"), event.get("event"))
+    else:
+        print(commands[item["index"]]["inv_id"], item)
@@ -0,0 +1,17 @@
+from helper.linux import LinuxSSHGroup
+from getpass import getpass
+from pprint import pprint
+
+# Every node of the AWX cluster needs the same manual project directory.
+linux_user = input("Enter non-root username of the AWX nodes: ")
+linux_pass = getpass()
+
+nodes = ["192.168.100.174", "192.168.100.175", "192.168.100.176"]
+
+with LinuxSSHGroup(hostnames=nodes, username=linux_user, password=linux_pass) as cluster:
+    # create the project directory on all nodes concurrently.
+    pprint(cluster.create_project_dir(dirname="lab_dev"))
+    # push only the changed playbooks to all nodes, the time taken is the time of the slowest node.
+    r = cluster.sync_project_dir(src_path="playbooks", dirname="lab_dev")
+    for node, result in r["nodes"].items():
+        print(node, result["result"].get("status"), round(result["elapsed"], 2))
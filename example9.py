@@ -0,0 +1,20 @@
+from helper.awx_api import Tower
+from getpass import getpass
+from pprint import pprint
+
+# Get the password from user.
+password = getpass()
+
+# Ansible Tower/AWX minimum configuration
+tower_config = {
+    "username": "admin",
+    "password": password,
+    "server_addr": "192.168.100.174"
+}
+
+tower = Tower(**tower_config)
+# The job template "acl" must have ask_limit_on_launch enabled, the hosts of its inventory are split into 4 batches
+# and each batch is launched as one job with limit.
+r = tower.sharded_job_launch(job_id="acl", shards=4, extra_vars={"acl_name": "ansible_push"})
+# host summaries of the 4 jobs are merged into one.
+pprint(r.get("summary"))
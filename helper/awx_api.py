@@ -12,15 +12,23 @@ Ansible AWX/Tower API wrapper is written as lab and testing code to teach myself
 my own python practice.
 """
 import json
-from typing import Optional, Dict, Any, Union, Tuple
+import time
+from queue import Empty, LifoQueue, Queue
+from threading import Lock
+from typing import Optional, Dict, Any, Union, Tuple, List, Iterator
 
 import requests
 from requests import Response
 from requests.adapters import HTTPAdapter
-from requests.auth import HTTPBasicAuth
-from requests.exceptions import ConnectionError, ConnectTimeout, HTTPError
+from requests.auth import HTTPBasicAuth, AuthBase
+from requests.exceptions import ConnectionError, ConnectTimeout, HTTPError, Timeout
 from urllib3.util.retry import Retry
 from types import MappingProxyType
+from helper.awx_cache import AwxCache, cache_path, CREDENTIAL_TYPES_TTL, SCHEME_TTL, VALIDATE_AFTER
+from helper.deadline import Deadline, DeadlineExceeded, DeadlineExecutor, current as current_deadline, \
+    sleep as deadline_sleep
+from helper.single_flight import SingleFlight
+from helper.striped import StripedDict
 # It is good to explicitly declare the objects I need, if I used the * all imports defined in credential_types_inputs
 # will also be imported.
 from helper.credential_types_inputs import (CREDENTIAL_TYPES,
@@ -36,6 +44,62 @@ from helper.credential_types_inputs import (CREDENTIAL_TYPES,
 
 CONN_ERROR = (ConnectTimeout, ConnectionError)
 
+# Job status reported by AWX once a job will not progress any further.
+JOB_FINISHED_STATUS = ("successful", "failed", "error", "canceled")
+
+# Counters of /api/v2/jobs/{id}/job_host_summaries/ that can be added up across jobs.
+HOST_SUMMARY_COUNTERS = ("changed", "dark", "failures", "ignored", "ok", "processed", "rescued", "skipped")
+
+# The child endpoint which holds the events of each kind of job.
+EVENTS_CHILD = MappingProxyType(
+    {
+        "jobs": "job_events",
+        "ad_hoc_commands": "events",
+        "project_updates": "events",
+        "inventory_updates": "events",
+        "system_jobs": "events"
+    }
+)
+
+# Resources which can be copied server side with /api/v2/{resource}/{id}/copy/
+COPYABLE_RESOURCES = ("job_templates", "projects", "inventories", "credentials")
+
+# Keys of summary_fields and the type of AWX objects which are remembered by Tower.harvest, and their resource.
+SUMMARY_RESOURCES = MappingProxyType(
+    {
+        "organization": "organizations",
+        "inventory": "inventories",
+        "project": "projects",
+        "credential": "credentials",
+        "credentials": "credentials",
+        "credential_type": "credential_types",
+        "job_template": "job_templates",
+        "workflow_job_template": "workflow_job_templates"
+    }
+)
+
+# Seconds given to deleting the token in close_session, it is tried even when the deadline of the caller is over.
+CLEANUP_TIMEOUT = 5.0
+
+# Number of names kept by the id cache and by the names seen in responses, the least recently used are dropped.
+ID_CACHE_SIZE = 65536
+
+# Resources fetched by Tower.warmup, these are the lookups done at the start of every provisioning run.
+WARMUP_RESOURCES = ("organizations", "credential_types", "credentials", "inventories", "projects", "job_templates")
+
+# A limit is a host pattern: hosts are separated by commas, these characters make a wildcard or a range and these
+# prefixes exclude, intersect or make a regex. Colons are kept in a comma separated limit, such as IPv6 addresses.
+LIMIT_PATTERN_CHARS = ",*?["
+LIMIT_PATTERN_PREFIXES = ("!", "&", "~")
+
+
+def limit_unsafe(host_name: str) -> bool:
+    """
+    True if the host name is not read literally in a limit, Ansible has no escape for a host pattern.
+    """
+    return any(char in host_name for char in LIMIT_PATTERN_CHARS) or host_name.startswith(LIMIT_PATTERN_PREFIXES)
+
+
 VERBOSITY = MappingProxyType(
     {
         "normal": 0,
@@ -48,19 +112,522 @@ VERBOSITY = MappingProxyType(
 )
 
 
+class BearerAuth(AuthBase):
+    """
+    OAuth2 token of Ansible AWX, sent instead of the username and password.
+    """
+    def __init__(self, token: str):
+        self.token = token
+
+    def __call__(self, r):
+        r.headers["Authorization"] = f"Bearer {self.token}"
+        return r
+
+
 class Tower:
     """
     The purpose of this class is so that multiple instances of different Ansible Tower/AWX can be created,
     and each instance is different from one another in terms of username, password, server address, port number.
+
+    One instance can be shared by the threads of a worker pool: with an opened session every request borrows an
+    http session from a bounded pool and gives it back when it is done, the caches are lock striped
+    (helper/striped.py), identical GETs in flight are shared (helper/single_flight.py) and the token is refreshed
+    once for all the threads when it expires.
+    See commands/tower_stress.py.
+
+    Any call, or any sequence of calls, can be given an overall deadline and be cancelled from another thread with
+    Tower.deadline, see helper/deadline.py.
     """
 
     def __init__(self, username: str = None, password: str = None,
-                 server_addr: str = "127.0.0.1", server_port: int = 8052, verify_ssl: bool = False):
+                 server_addr: str = "127.0.0.1", server_port: int = 8052, verify_ssl: bool = False,
+                 disk_cache: bool = False, warmup: bool = False):
+        """
+        :param disk_cache:
+            Keep the scheme, the credential type ids and the name to id mappings in ~/.ansible_api/awx_cache,
+            shared with the other processes of the same user, see helper/awx_cache.py.
+        :param warmup:
+            Fill the lookup caches at construction, see warmup. The report is kept in warmup_report, the cache is
+            kept by open_session and dropped by close_session.
+        """
         self.username = username
         self.password = password
         self.server_addr = server_addr
         self.server_port = server_port
         self.verify_ssl = verify_ssl
+        self.cache = AwxCache(cache_path(username, server_addr, server_port)) if disk_cache else None
+        self._flight = SingleFlight()
+        # See open_session, when not opened every request opens its own connection and probes the scheme.
+        self._session_open = False
+        self._pool_maxsize = 10
+        # requests.Session lent to one request at a time, see _acquire. Every session made is also kept in _sessions,
+        # so close_session can close all of them, including the sessions lent out at that moment.
+        self._pool = None
+        self._sessions = list()
+        self._sessions_lock = Lock()
+        self._api_url = None
+        self._token = None
+        self._token_lock = Lock()
+        # (resource, name) to id, only kept while a session is opened or after warmup, see find_resource_id.
+        self.id_cache = None
+        # namespace to credential type id read from AWX, see credential_type_id.
+        self._credential_types = None
+        # keys of the disk cache which this process has validated or stored itself, see cached_id.
+        self._validated = StripedDict(maxsize=ID_CACHE_SIZE)
+        # (resource, id) to name, seen in responses, see harvest and resolve_name.
+        self._names = StripedDict(maxsize=ID_CACHE_SIZE)
+        self.warmup_report = self.warmup() if warmup else None
+
+    def open_session(self, pool_maxsize: int = 10, token: bool = False) -> "Tower":
+        """
+        Keep pooled and authenticated http sessions for all the requests of this instance, a request borrows one
+        and gives it back when it is done, whichever thread it runs on. The scheme is probed once when the
+        session is opened. This is for running many operations in a row,
+        such as the batch mode and the daemon of the cli, and for sharing the instance across worker threads.
+        :param pool_maxsize:
+            Maximum number of http sessions, and of requests sent at the same moment, a request waits for a
+            session once all of them are lent out.
+        :param token:
+            Create an OAuth2 token and use it instead of the username and password, the token is deleted by
+            close_session. If the token cannot be created the username and password are used.
+        :return:
+            the instance itself, so that Tower(...).open_session() can be used.
+        """
+        # the ids of warmup, or of the session opened before, stay valid for the new session.
+        id_cache = self.id_cache
+        self.close_session()
+        self._pool_maxsize = pool_maxsize
+        self._api_url = self.get_api_url()
+        with self._sessions_lock:
+            self._pool = LifoQueue()
+            self._session_open = True
+        self.id_cache = id_cache if id_cache is not None else StripedDict(maxsize=ID_CACHE_SIZE)
+        if token:
+            self._token = self._create_token()
+        return self
+
+    def close_session(self):
+        token, self._token = self._token, None
+        if token is not None:
+            # deleted with the username and password, the token is no longer used by this instance.
+            try:
+                with Deadline(CLEANUP_TIMEOUT, inherit=False):
+                    self.delete_request(resource_id=token["id"], resource="tokens")
+            except DeadlineExceeded:
+                # AWX expires the token by itself.
+                pass
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, list()
+            pool, self._pool = self._pool, None
+            self._session_open = False
+        if pool is not None:
+            # wakes up the requests waiting for a session, they are sent without a session.
+            pool.put(requests)
+        for session in sessions:
+            session.close()
+        self._api_url = None
+        self.id_cache = None
+
+    @staticmethod
+    def deadline(seconds: float = None) -> Deadline:
+        """
+        Overall deadline of everything this thread does on Ansible AWX inside the with block, including the
+        lookups done by the methods themselves and the work they hand to their worker threads.
+        Every request is sent with the remaining time as its timeouts, DeadlineExceeded is raised once the time
+        is over or the deadline is cancelled, with the progress made so far.
+
+        with tower.deadline(30) as deadline:
+            tower.find_resource_id(resource="projects", name="lab")
+
+        Call deadline.cancel() from any other thread to stop the calls.
+        :param seconds:
+            the budget, None for no budget but still cancellable.
+        :return:
+            Deadline which is also the cancellation token.
+        """
+        return Deadline(seconds)
+
+    def _create_token(self) -> Optional[Dict[str, Any]]:
+        """
+        Create an OAuth2 token, always with the username and password as the current token could have expired.
+        :return:
+            dictionary of token id and auth, None if the token cannot be created.
+        """
+        is_https_status, base_url = self.get_api_url()
+        config = {
+            "auth": HTTPBasicAuth(self.username, self.password),
+            "data": json.dumps({"description": "ansible_api session", "application": None, "scope": "write"}),
+            "headers": self.app_header()
+        }
+        if is_https_status:
+            config.update({"verify": self.verify_ssl})
+        try:
+            response = self._request("post", base_url + "/v2/tokens/", config)
+        except CONN_ERROR:
+            return None
+        if response.status_code != 201:
+            return None
+        return {
+            "id": response.json()["id"],
+            "auth": BearerAuth(response.json()["token"])
+        }
+
+    def _refresh_token(self, stale: AuthBase) -> Optional[AuthBase]:
+        """
+        Replace the expired token, when many threads get 401 at the same moment only the first one creates a new
+        token, the others find the token already replaced and use it.
+        :param stale:
+            the auth which got 401.
+        :return:
+            the auth to retry with, None if there is no token or it cannot be created.
+        """
+        with self._token_lock:
+            token = self._token
+            if token is None:
+                return None
+            if token["auth"] is not stale:
+                return token["auth"]
+            new_token = self._create_token()
+            if new_token is None:
+                return None
+            self._token = new_token
+        # best effort, the old token is most likely already gone.
+        self.delete_request(resource_id=token["id"], resource="tokens")
+        return new_token["auth"]
+
+    def _send(self, method: str, url: str, **config) -> Response:
+        """
+        Every request of the instance goes through here, a request with an expired token is sent once more with
+        the refreshed token.
+        """
+        response = self._request(method, url, config)
+        if response.status_code == 401 and isinstance(config.get("auth"), BearerAuth):
+            auth = self._refresh_token(config["auth"])
+            if auth is not None:
+                config.update({"auth": auth})
+                response = self._request(method, url, config)
+        return response
+
+    def _request(self, method: str, url: str, config: Dict[str, Any]) -> Response:
+        """
+        One request under the deadline of the thread, if there is one, the remaining time is the timeout.
+        """
+        deadline = current_deadline()
+        pool, session = self._acquire()
+        try:
+            if deadline is None:
+                return getattr(session, method)(url, **config)
+            doing = f"{method.upper()} {url}"
+            # checked and turned into timeouts with one reading of the clock.
+            timeout = deadline.timeout(doing)
+            try:
+                response = getattr(session, method)(url, timeout=timeout, **config)
+            except Timeout as e:
+                if deadline.expired():
+                    raise deadline.exceeded(doing) from e
+                # the connect timeout of a server which is down, reported like any other connection error.
+                raise
+            deadline.record(method, url, response.status_code)
+            return response
+        finally:
+            self._release(pool, session)
+
+    def _shared(self, key: Tuple, fn, copy: bool = True) -> Any:
+        """
+        SingleFlight.do under the deadline of the thread, a caller does not wait for a call in flight longer than
+        its own deadline, and does not take the DeadlineExceeded of another thread as its own.
+        """
+        deadline = current_deadline()
+        if deadline is None:
+            return self._flight.do(key, fn, copy=copy)[0]
+        try:
+            return self._flight.do(key, fn, copy=copy, timeout=deadline.remaining())[0]
+        except TimeoutError as e:
+            raise deadline.exceeded(f"waiting for {key[0]} {key[1]}") from e
+        except DeadlineExceeded:
+            if deadline.expired():
+                raise
+            # the deadline of the thread which sent the request is over, not ours.
+            return fn()
+
+    def cached_id(self, resource: str, name: str) -> Optional[int]:
+        """
+        Look up the id of the name in the id cache of the session, then in the disk cache.
+        An entry of the disk cache is only trusted if AWX still has the object with the same id, name and modified
+        timestamp, which is one small GET instead of a lookup. It is checked the first time this process uses it,
+        whoever stored it, and again once it has not been validated for VALIDATE_AFTER seconds. An object deleted or
+        created again under the same name by another tool within those seconds can still be given to this process.
+        Only exact names are cached, the name in the filter also drops an entry stored under a part of a name.
+        :return:
+            id, None if the name is not cached or the entry is stale.
+        """
+        # another thread can close the session at any moment, so the cache is read once.
+        id_cache = self.id_cache
+        resource_id = id_cache.get((resource, name)) if id_cache is not None else None
+        if resource_id is not None:
+            return resource_id
+        if self.cache is None:
+            return None
+        key = f"id:{resource}:{name}"
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry["age"] > VALIDATE_AFTER or key not in self._validated:
+            is_https_status, base_url = self.get_api_url()
+            response = self.get_request(f"{base_url}/v2/{resource}/", is_https_status,
+                                        params={"id": entry["value"], "name": name, "modified": entry["modified"],
+                                                "page_size": 1})
+            if response["status"] != 200 or response["response"].get("count") != 1:
+                # renamed, modified or deleted since it was cached.
+                self.cache.delete(key)
+                return None
+            self.cache.touch(key)
+            self._validated[key] = True
+        if id_cache is not None:
+            id_cache[(resource, name)] = entry["value"]
+        return entry["value"]
+
+    def remember_id(self, resource: str, name: str, resource_id: int, modified: str = None):
+        self._names[(resource, int(resource_id))] = name
+        id_cache = self.id_cache
+        if id_cache is not None:
+            id_cache[(resource, name)] = resource_id
+        if self.cache is not None and modified is not None:
+            self.cache.put(f"id:{resource}:{name}", resource_id, modified=modified)
+            self._validated[f"id:{resource}:{name}"] = True
+
+    def forget_id(self, resource: str, resource_id: int):
+        """
+        Remove the deleted or stale id from the id cache and the disk cache.
+        """
+        self._names.pop((resource, int(resource_id)), None)
+        if self.cache is not None:
+            self.cache.forget_value(f"id:{resource}:", int(resource_id))
+        id_cache = self.id_cache
+        if id_cache is None:
+            return
+        for key, cached_id in id_cache.items():
+            if key[0] == resource and cached_id == int(resource_id):
+                id_cache.pop(key, None)
+
+    def harvest(self, obj: Any):
+        """
+        AWX embeds the id and name of the related objects in summary_fields of nearly every response, such as
+        the inventory and project of a job template. Remember them, and the object itself, so resolve_name and
+        find_resource_id do not need another GET. Lists are harvested object by object.
+        """
+        if not isinstance(obj, dict):
+            return
+        if isinstance(obj.get("results"), list):
+            for result in obj["results"]:
+                self.harvest(result)
+            return
+        resource = SUMMARY_RESOURCES.get(obj.get("type"))
+        if resource is not None and obj.get("id") is not None and obj.get("name") is not None:
+            self.remember_id(resource, obj["name"], obj["id"])
+        for field, summary in (obj.get("summary_fields") or {}).items():
+            resource = SUMMARY_RESOURCES.get(field)
+            if resource is None:
+                continue
+            for related in summary if isinstance(summary, list) else [summary]:
+                if isinstance(related, dict) and related.get("id") is not None and related.get("name") is not None:
+                    self.remember_id(resource, related["name"], related["id"])
+
+    def resolve_name(self, resource: str, resource_id: int) -> Optional[str]:
+        """
+        Name of the object, from the names already seen in responses, otherwise one GET.
+        :return:
+            name, None if the object does not exist.
+        """
+        name = self._names.get((resource, int(resource_id)))
+        if name is not None:
+            return name
+        is_https_status, base_url = self.get_api_url()
+        response = self.get_request(f"{base_url}/v2/{resource}/{resource_id}/", is_https_status)
+        if response["status"] != 200:
+            return None
+        return response["response"].get("name")
+
+    def related(self, obj: Dict[str, Any], field: str) -> Union[Dict[str, Any], List[Dict[str, Any]], None]:
+        """
+        Related object of a response, such as related(job_template, "inventory").
+        summary_fields already has the id, name and a few more fields of the related object, the related url is
+        only followed if summary_fields does not have it, for the full related object use the related url.
+        :param obj:
+            an AWX object from any response.
+        :param field:
+            key of summary_fields or related.
+        :return:
+            the summary, or the response of the related url, None if neither exists.
+        """
+        summary = (obj.get("summary_fields") or {}).get(field)
+        if summary is not None:
+            return summary
+        url = (obj.get("related") or {}).get(field)
+        if url is None:
+            return None
+        is_https_status, base_url = self.get_api_url()
+        # the related url is relative to the server root such as /api/v2/inventories/1/
+        response = self.get_request(base_url[:-len("/api")] + url, is_https_status)
+        return response["response"] if response["status"] == 200 else None
+
+    def request_stats(self) -> Dict[str, int]:
+        """
+        Counters of the GET requests, coalesced is the number of requests saved by sharing an identical request
+        which was already in flight.
+        """
+        return self._flight.stats()
+
+    def credential_type_id(self, credential_type: str) -> Optional[int]:
+        """
+        Credential type id by its namespace such as ssh or aws.
+        Without the disk cache this is the static CREDENTIAL_TYPES of Ansible AWX 9.2.0, with the disk cache the ids
+        are read from /api/v2/credential_types/ once and kept, so another AWX version gets its own ids.
+        """
+        credential_type = str.lower(credential_type)
+        if self._credential_types is not None:
+            # read by warmup.
+            return self._credential_types.get(credential_type, CREDENTIAL_TYPES.get(credential_type))
+        if self.cache is None:
+            return CREDENTIAL_TYPES.get(credential_type)
+        entry = self.cache.get("credential_types")
+        if entry is None or entry["age"] >= CREDENTIAL_TYPES_TTL:
+            response = self.get_all_pages("/v2/credential_types/")
+            if response["status"] != "success":
+                return CREDENTIAL_TYPES.get(credential_type)
+            namespaces = {result["namespace"]: result["id"] for result in response["results"]
+                          if result.get("namespace")}
+            self.cache.put("credential_types", namespaces)
+        else:
+            namespaces = entry["value"]
+        return namespaces.get(credential_type, CREDENTIAL_TYPES.get(credential_type))
+
+    def warmup(self, resources: Tuple[str, ...] = WARMUP_RESOURCES, max_workers: int = 6) -> Dict[str, Any]:
+        """
+        Fetch every page of the resources in parallel and fill the name to id cache (and the disk cache if it is
+        enabled) and the credential type ids, so the first find_resource_id of a provisioning run is already warm.
+        The cache is keyed by the exact name, find_resource_id of a part of a name still asks AWX.
+        :param resources:
+            list endpoints to fetch.
+        :param max_workers:
+            number of resources fetched concurrently, the pages of one resource are fetched one after another.
+        :return:
+            dictionary of status, elapsed seconds, seconds spent on probing the scheme, and the count,
+            elapsed seconds and status of each resource.
+        """
+        start = time.monotonic()
+        if self.id_cache is None:
+            self.id_cache = StripedDict(maxsize=ID_CACHE_SIZE)
+        id_cache = self.id_cache
+        # probe the scheme once for all the resources instead of once per resource.
+        pinned = self._api_url is None
+        if pinned:
+            self._api_url = self.get_api_url()
+        probe_elapsed = time.monotonic() - start
+
+        def fetch(resource: str) -> Dict[str, Any]:
+            resource_start = time.monotonic()
+            response = self.get_all_pages(f"/v2/{resource}/")
+            entries = list()
+            for result in response["results"] if resource != "credential_types" else []:
+                key = (resource, result.get("name"))
+                self._names[(resource, result["id"])] = result.get("name")
+                # the first object of a duplicated name wins, the same as find_resource_id.
+                if id_cache.setdefault(key, result["id"]) == result["id"]:
+                    if result.get("modified") is not None:
+                        entries.append((f"id:{resource}:{result.get('name')}", result["id"], result["modified"]))
+            if self.cache is not None:
+                self.cache.put_many(entries)
+                for key, _, _ in entries:
+                    self._validated[key] = True
+            if resource == "credential_types" and response["status"] == "success":
+                self._credential_types = {result["namespace"]: result["id"] for result in response["results"]
+                                          if result.get("namespace")}
+                if self.cache is not None:
+                    self.cache.put("credential_types", self._credential_types)
+            report = {
+                "status": response["status"],
+                "count": len(response["results"]),
+                "elapsed": time.monotonic() - resource_start
+            }
+            if response["status"] != "success":
+                report.update({"message": response["message"]})
+            return report
+
+        try:
+            with DeadlineExecutor(max_workers=max_workers) as executor:
+                reports = dict(zip(resources, executor.map(fetch, resources)))
+        finally:
+            if pinned:
+                self._api_url = None
+        return {
+            "status": "success" if all(r["status"] == "success" for r in reports.values()) else "failed",
+            "elapsed": time.monotonic() - start,
+            "scheme_probe": probe_elapsed,
+            "resources": reports
+        }
+
+    @property
+    def auth(self) -> AuthBase:
+        token = self._token
+        return token["auth"] if token is not None else HTTPBasicAuth(self.username, self.password)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_session()
+
+    def _acquire(self) -> Tuple[Optional[LifoQueue], Any]:
+        """
+        Borrow a requests.Session, requests.Session and the requests module have the same get/post/patch/delete,
+        so the methods do not need to care whether a session is opened. requests.Session is not documented as
+        thread safe, a session is only used by one request at a time. The most recently returned session is lent
+        first, it is the one whose connection is most likely still open.
+        :return:
+            the pool to give the session back to, None if the requests module is returned.
+        """
+        with self._sessions_lock:
+            if not self._session_open:
+                return None, requests
+            pool = self._pool
+            try:
+                return self._lent(pool, pool.get_nowait())
+            except Empty:
+                pass
+            if len(self._sessions) < self._pool_maxsize:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions.append(session)
+                return pool, session
+        # every session is lent out, wait for one, not longer than the deadline of this thread.
+        deadline = current_deadline()
+        while True:
+            if deadline is not None:
+                deadline.check("waiting for an http session")
+            try:
+                return self._lent(pool, pool.get(timeout=0.1 if deadline is not None else None))
+            except Empty:
+                continue
+
+    @staticmethod
+    def _lent(pool: LifoQueue, session: Any) -> Tuple[Optional[LifoQueue], Any]:
+        if session is requests:
+            # the pool is closed, pass the news on to the next waiting request.
+            pool.put(requests)
+            return None, requests
+        return pool, session
+
+    def _release(self, pool: Optional[LifoQueue], session: Any):
+        if pool is None:
+            return
+        if pool is self._pool:
+            pool.put(session)
+        else:
+            # returned after close_session, which has already closed it.
+            session.close()
 
     @staticmethod
     def app_header() -> Dict[str, str]:
@@ -103,15 +670,17 @@ class Tower:
             api_uri = f"/v2/{resource}/"
         is_https_status, base_url = self.get_api_url()
         config = {
-            "auth": HTTPBasicAuth(self.username, self.password),
+            "auth": self.auth,
             "headers": self.app_header()
         }
         if is_https_status:
             config.update({"verify": self.verify_ssl})
         url = base_url + api_uri
         try:
-            response = requests.delete(url, **config)
+            response = self._send("delete", url, **config)
             if response.status_code == 204:
+                if child_resource is None and resource_id is not None:
+                    self.forget_id(resource, resource_id)
                 return {
                     "status": "success",
                     "message": f"Resource {resource} with id {resource_id} has deleted."
@@ -153,7 +722,7 @@ class Tower:
             Dictionary of response.
         """
         config = {
-            "auth": HTTPBasicAuth(username=self.username, password=self.password),
+            "auth": self.auth,
             "data": json.dumps(payload),
             "headers": self.app_header()
         }
@@ -161,13 +730,15 @@ class Tower:
             config.update({"verify": self.verify_ssl})
 
         try:
-            response = requests.post(url, **config)
+            response = self._send("post", url, **config)
             response.raise_for_status()
             # I have realized when posting /api/v2/job_templates/{id}/credentials/ returns an empty response hence
             # json decoder will raise an exception as server did not return a valid json response.
+            result = response.json() if response.content else "response has no content."
+            self.harvest(result)
             return {
                 "status": response.status_code,
-                "response": response.json() if response.content else "response has no content."
+                "response": result
             }
         except CONN_ERROR as e:
             # 522 - Connection timeout.
@@ -182,6 +753,163 @@ class Tower:
                 "response": str(e)
             }
 
+    def get_request(self, url: str, is_https_status: bool,
+                    params: Dict[str, Any] = None) -> Union[Dict[str, str], Dict[str, int], Dict[str, Any]]:
+        """
+        The GET counterpart of post_request, the response is returned in the same format so that the caller
+        does not need to care whether it is a GET or a POST.
+        :param url:
+            The url for calling the API
+        :param is_https_status:
+            This is a lazy way to determine if the prefix is https or not.
+        :param params:
+            Query string such as page_size, id__gt, order_by.
+        :return:
+            Dictionary of response.
+        """
+        config = {
+            "auth": self.auth,
+            "headers": self.app_header()
+        }
+        if params is not None:
+            config.update({"params": params})
+        if is_https_status:
+            config.update({"verify": self.verify_ssl})
+
+        def fetch():
+            try:
+                response = self._send("get", url, **config)
+                response.raise_for_status()
+                result = response.json() if response.content else "response has no content."
+                self.harvest(result)
+                return {
+                    "status": response.status_code,
+                    "response": result
+                }
+            except CONN_ERROR as e:
+                return {
+                    "status": 522 if CONN_ERROR[0] else 408,
+                    "response": str(e)
+                }
+            except HTTPError as e:
+                return {
+                    "status": response.status_code,
+                    "response": str(e)
+                }
+
+        # identical GETs in flight at the same moment share one request, see helper/single_flight.py
+        return self._shared(("GET", url, json.dumps(params, sort_keys=True, default=str)), fetch)
+
+    def patch_request(self, url: str, is_https_status: bool,
+                      payload: Dict[str, Any]) -> Union[Dict[str, str], Dict[str, int], Dict[str, Any]]:
+        """
+        The PATCH counterpart of post_request, only the fields in the payload are modified.
+        :param url:
+            The url for calling the API
+        :param is_https_status:
+            This is a lazy way to determine if the prefix is https or not.
+        :param payload:
+            The fields to be modified.
+        :return:
+            Dictionary of response.
+        """
+        config = {
+            "auth": self.auth,
+            "data": json.dumps(payload),
+            "headers": self.app_header()
+        }
+        if is_https_status:
+            config.update({"verify": self.verify_ssl})
+        try:
+            response = self._send("patch", url, **config)
+            response.raise_for_status()
+            return {
+                "status": response.status_code,
+                "response": response.json() if response.content else "response has no content."
+            }
+        except CONN_ERROR as e:
+            return {
+                "status": 522 if CONN_ERROR[0] else 408,
+                "response": str(e)
+            }
+        except HTTPError as e:
+            return {
+                "status": response.status_code,
+                "response": str(e)
+            }
+
+    def get_all_pages(self, api_uri: str = None,
+                      params: Dict[str, Any] = None,
+                      page_size: int = 200) -> Union[Dict[str, str], Dict[str, List]]:
+        """
+        GET on a list endpoint only returns one page, the "next" key points to the next page which is relative
+        to the server root e.g. /api/v2/inventories/1/hosts/?page=2.
+        This method follows "next" until the last page and collects all the results.
+        :param api_uri:
+            The uri after /api, such as /v2/inventories/1/hosts/
+        :param params:
+            Additional query string, such as filters and order_by.
+        :param page_size:
+            Number of objects per page, AWX caps this at 200 by default.
+        :return:
+            Dictionary with status and results which is a list of all objects collected.
+        """
+        results = list()
+        try:
+            for response in self.iter_pages(api_uri, params=params, page_size=page_size):
+                if response["status"] != 200 or not isinstance(response["response"], dict):
+                    return {
+                        "status": "failed",
+                        "message": response["response"],
+                        "results": results
+                    }
+                results.extend(response["response"].get("results", []))
+        except DeadlineExceeded as e:
+            # the pages collected before the deadline is over are given back.
+            e.partial = {"results": results}
+            raise
+        return {
+            "status": "success",
+            "results": results
+        }
+
+    def iter_pages(self, api_uri: str = None, params: Dict[str, Any] = None, page_size: int = 200,
+                   prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Generator of the pages of a list endpoint, for collections too large to be kept in memory such as
+        100k hosts. Only the current page, and the next page if prefetch, are held at any time.
+        :param api_uri:
+            The uri after /api, such as /v2/inventories/1/hosts/
+        :param params:
+            Additional query string, such as filters and order_by.
+        :param page_size:
+            Number of objects per page, AWX caps this at 200 by default.
+        :param prefetch:
+            Request the next page while the caller is working on the current page.
+        :return:
+            Generator of get_request responses, the generator stops after the first failed response or the first page
+            whose body is not a json object, such as "response has no content.".
+        """
+        is_https_status, base_url = self.get_api_url()
+        # base_url ends with /api, the next page uri already contains /api.
+        server_root = base_url[:-len("/api")]
+        query = {"page_size": page_size}
+        if params is not None:
+            query.update(params)
+        with DeadlineExecutor(max_workers=1) as executor:
+            future = executor.submit(self.get_request, base_url + api_uri, is_https_status, query)
+            while future is not None:
+                response = future.result()
+                page = response["response"]
+                next_page = page.get("next") if response["status"] == 200 and isinstance(page, dict) else None
+                # the query string is already part of the next page uri.
+                future = None
+                if next_page and prefetch:
+                    future = executor.submit(self.get_request, server_root + next_page, is_https_status)
+                yield response
+                if next_page and not prefetch:
+                    future = executor.submit(self.get_request, server_root + next_page, is_https_status)
+
     def get_api_url(self, total_retries: int = 2, backoff_factor: float = 0.5,
                     verify_ssl: bool = False, request_timeout: float = 0.5) -> Tuple[bool, str]:
         """
@@ -198,17 +926,37 @@ class Tower:
         :return:
             Tuple, index 0 is status to tell if it is https or not, index 1 is the full url.
         """
+        if self._api_url is not None:
+            # probed once by open_session.
+            return self._api_url
+        if self.cache is not None:
+            entry = self.cache.get("scheme")
+            if entry is not None and entry["age"] < SCHEME_TTL:
+                return tuple(entry["value"])
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check("probing the scheme")
+            request_timeout = min(request_timeout, deadline.remaining() or request_timeout)
         retries = Retry(total=total_retries,
                         backoff_factor=backoff_factor,
                         status_forcelist=[500, 502, 503, 504])
         url = "https://" + self.server_addr + ":" + str(self.server_port) + "/api"
+        answered = True
         with requests.Session() as s:
             s.mount("https://", HTTPAdapter(max_retries=retries))
             try:
                 s.get(url, verify=verify_ssl, timeout=request_timeout)
-                return True, url
+                api_url = True, url
             except CONN_ERROR:
-                return False, url.replace("https://", "http://")
+                api_url = False, url.replace("https://", "http://")
+                # a blip of the https probe must not pin http for a day, http is kept only if it answers.
+                try:
+                    s.get(api_url[1], timeout=request_timeout)
+                except (*CONN_ERROR, Timeout):
+                    answered = False
+        if self.cache is not None and answered:
+            self.cache.put("scheme", api_url)
+        return api_url
 
     def get_resource_info(self, resource: str = None, resource_id: int = None):
         if resource is not None and resource_id is not None:
@@ -224,13 +972,14 @@ class Tower:
         is_https_status, base_url = self.get_api_url()
         url = base_url + api_uri
         config = {
-            "auth": HTTPBasicAuth(self.username, self.password),
+            "auth": self.auth,
             "headers": self.app_header()
         }
         if is_https_status:
             config.update({"verify": self.verify_ssl})
         try:
-            response = requests.get(url, **config)
+            # the Response is shared by identical calls in flight at the same moment, it is never changed.
+            response = self._shared(("GET", url, None), lambda: self._send("get", url, **config), copy=False)
             if response.status_code == 401:
                 # if unauthorized.
                 return response.json()
@@ -262,11 +1011,19 @@ class Tower:
         So to make life easy always use unique names for your creation.
         This method behaves similarly to the ?search=findme documented in the API guide, just that ?search=findme will
         return a list of the found items.
+        An object named exactly name is preferred to an object whose name only contains name, so the answer is the
+        same whether it comes from the id cache, which only knows exact names, or from AWX.
         :param resource:
             Also known as the endpoint, can be projects, credentials, inventories, organizations
         :param name:
         :return:
         """
+        resource_id = self.cached_id(resource, name)
+        if resource_id is not None:
+            return {
+                "found": True,
+                "result": resource_id
+            }
         response = self.get_resource_info(resource=resource)
         if isinstance(response, Response):
             if response.status_code == 401:
@@ -274,8 +1031,11 @@ class Tower:
                 return response.json()
             # To ensure the response object is Response class before giving the json() result.
             results = response.json()["results"]
-            for result in results:
+            exact = [result for result in results if result["name"] == name]
+            for result in exact or results:
                 if name in result["name"]:
+                    # remembered by its own name, a partial match must not give the object the name asked for.
+                    self.remember_id(resource, result["name"], int(result["id"]), modified=result.get("modified"))
                     return {
                         "found": True,
                         "result": int(result["id"])
@@ -465,7 +1225,7 @@ class Tower:
         # Base payload. See Ansible Tower API reference guide.
         payload = {
             "name": name,
-            "credential_type": CREDENTIAL_TYPES.get(str.lower(credential_type))
+            "credential_type": self.credential_type_id(credential_type)
         }
         # Description is optional.
         if desc is not None:
@@ -555,7 +1315,8 @@ class Tower:
                     return {
                         "status": "failed",
                         "status_code": 400,
-                        "message": "Username and password are compulsory keys, but these are not found in inputs. See example.",
+                        "message": "Username and password are compulsory keys, but these are not found in inputs. "
+                                   "See example.",
                         "example": dict(zip(AWS_INPUTS, ["accesskey", "secretkey"]))
                     }
                 payload.update(
@@ -654,6 +1415,7 @@ class Tower:
         """
         response = self.get_resource_info(resource=info_type)
         results = response.json().get("results")
+        self.harvest(response.json())
         collect_ids = list()
         collect_names = list()
         collect_params = list()
@@ -691,9 +1453,9 @@ class Tower:
         url = base_url + api_uri
 
         if org_id != 1:
-            # Ensure the org_id is valid.
-            org_info = self.collect_info(info_type="organizations")
-            if org_id not in org_info["ids"]:
+            # Ensure the org_id is valid, the organizations are only collected for the helper message.
+            if self.resolve_name("organizations", org_id) is None:
+                org_info = self.collect_info(info_type="organizations")
                 return {
                     "status": "failed",
                     "status_code": 400,
@@ -722,14 +1484,15 @@ class Tower:
             if local_path in lpath["used"]:
                 return {
                     "status": "failed",
-                    "message": f"local_path ({local_path}) is currently being used by project ({project_name[local_path]})."
+                    "message": f"local_path ({local_path}) is currently being used by project "
+                               f"({project_name[local_path]})."
                 }
             payload.update({"local_path": local_path})
         if credential is not None and isinstance(credential, int):
             # Check if the id supplied is valid, if it is not valid, a helper message will appear to guide user.
-            creds = self.collect_info()
-            if credential not in creds.get("ids"):
+            if self.resolve_name("credentials", credential) is None:
                 # helper message not only sounds error, but also provide a dictionary of valid credentials.
+                creds = self.collect_info()
                 return {
                     "status": "failed",
                     "message": f"Credential ID {credential} is not found in Ansible AWX.",
@@ -960,7 +1723,20 @@ class Tower:
                 "required": ", ".join(required)
             }
 
-    def job_launch(self, job_id: Union[str, int] = None, extra_vars: Dict = None):
+    def job_launch(self, job_id: Union[str, int] = None, extra_vars: Dict = None, limit: str = None):
+        """
+        Launch a job template.
+        :param job_id:
+            job template name or id.
+        :param extra_vars:
+            extra variables for the playbook, job template must have ask_variables_on_launch.
+        :param limit:
+            host pattern which restricts the hosts of the inventory the job runs on,
+            job template must have ask_limit_on_launch.
+        :return:
+            Dictionary of response, if the job template is sliced the response is the parent workflow job,
+            sliced is True and workflow_job is its id.
+        """
         if isinstance(job_id, str):
             response = self.find_resource_id(resource="job_templates", name=job_id)
             if response.get("found"):
@@ -982,8 +1758,782 @@ class Tower:
         payload = {
             "extra_vars": extra_vars
         }
+        if limit is not None:
+            payload.update({"limit": limit})
+        response = self.post_request(url, is_https_status, payload)
+        if response["status"] == 201 and response["response"].get("type") == "workflow_job":
+            # A sliced job template (job_slice_count > 1) launches a workflow job which spawns the slice jobs.
+            response.update(
+                {
+                    "sliced": True,
+                    "workflow_job": response["response"].get("id")
+                }
+            )
+        return response
+
+    def wait_job(self, job_id: int = None, resource: str = "jobs",
+                 poll_interval: float = 2.0, timeout: float = 0) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Poll the job until AWX reports it is finished.
+        :param job_id:
+            id of the job, this is the id returned by job_launch not the job template id.
+        :param resource:
+            jobs, workflow_jobs, ad_hoc_commands or project_updates, they all share the status field.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up waiting, 0 waits forever.
+        :return:
+            Dictionary with the last job detail returned by AWX.
+        """
+        is_https_status, base_url = self.get_api_url()
+        url = base_url + f"/v2/{resource}/{job_id}/"
+        start = time.monotonic()
+        while True:
+            response = self.get_request(url, is_https_status)
+            if response["status"] != 200:
+                return {
+                    "status": "failed",
+                    "message": response["response"]
+                }
+            job = response["response"]
+            if job.get("status") in JOB_FINISHED_STATUS:
+                return {
+                    "status": "success",
+                    "job": job
+                }
+            if 0 < timeout <= time.monotonic() - start:
+                return {
+                    "status": "failed",
+                    "message": f"{resource} {job_id} is still {job.get('status')} after {timeout} seconds.",
+                    "job": job
+                }
+            try:
+                # wakes up at once when the deadline of the thread is cancelled.
+                deadline_sleep(poll_interval, f"waiting for {resource} {job_id}")
+            except DeadlineExceeded as e:
+                e.partial = {"job": job}
+                raise
+
+    def job_host_summaries(self, job_id: int = None) -> Union[Dict[str, str], Dict[str, List]]:
+        """
+        Collect the per host summary (ok, changed, failures, dark...) of a finished job.
+        :param job_id:
+            id of the job.
+        :return:
+            Dictionary with results, a list of host summaries.
+        """
+        return self.get_all_pages(api_uri=f"/v2/jobs/{job_id}/job_host_summaries/")
+
+    @staticmethod
+    def merge_host_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge host summaries from several jobs into one, counters of the same host are added up.
+        :param summaries:
+            list of host summaries from /api/v2/jobs/{id}/job_host_summaries/
+        :return:
+            Dictionary of hosts keyed by host name and the totals of every counter.
+        """
+        hosts = dict()
+        totals = dict.fromkeys(HOST_SUMMARY_COUNTERS, 0)
+        for summary in summaries:
+            host = hosts.setdefault(summary.get("host_name"), dict.fromkeys(HOST_SUMMARY_COUNTERS, 0))
+            for counter in HOST_SUMMARY_COUNTERS:
+                host[counter] += summary.get(counter) or 0
+                totals[counter] += summary.get(counter) or 0
+            host["failed"] = host.get("failed", False) or bool(summary.get("failed"))
+        return {
+            "hosts": hosts,
+            "totals": totals,
+            "failed_hosts": [name for name, host in hosts.items() if host["failed"]]
+        }
+
+    def follow_job(self, job_id: int = None, poll_interval: float = 2.0,
+                   timeout: float = 0) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Wait for a job to finish and collect its host summaries.
+        :param job_id:
+            id of the job.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up waiting, 0 waits forever.
+        :return:
+            Dictionary of job status, timing and host summaries.
+        """
+        job_response = self.wait_job(job_id=job_id, poll_interval=poll_interval, timeout=timeout)
+        if job_response["status"] != "success":
+            job_response.update({"job": job_id})
+            return job_response
+        job = job_response["job"]
+        summaries = self.job_host_summaries(job_id=job_id)
+        return {
+            "status": summaries["status"],
+            "job": job_id,
+            "job_status": job.get("status"),
+            "started": job.get("started"),
+            "finished": job.get("finished"),
+            "elapsed": job.get("elapsed"),
+            "host_summaries": summaries["results"]
+        }
+
+    def slice_jobs(self, workflow_job_id: int = None, poll_interval: float = 2.0,
+                   timeout: float = 0) -> Union[Dict[str, str], Dict[str, List]]:
+        """
+        A sliced job template launches a workflow job, the workflow job spawns one job per slice shortly after.
+        This method waits until every workflow node has its job and returns the slice job ids.
+        :param workflow_job_id:
+            id of the workflow job returned by job_launch.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up waiting, 0 waits forever.
+        :return:
+            Dictionary with jobs, a list of slice job ids.
+        """
+        start = time.monotonic()
+        while True:
+            nodes = self.get_all_pages(api_uri=f"/v2/workflow_jobs/{workflow_job_id}/workflow_nodes/")
+            if nodes["status"] != "success":
+                return nodes
+            jobs = [node.get("job") for node in nodes["results"]]
+            if jobs and all(job is not None for job in jobs):
+                return {
+                    "status": "success",
+                    "jobs": jobs
+                }
+            if 0 < timeout <= time.monotonic() - start:
+                return {
+                    "status": "failed",
+                    "message": f"workflow_jobs {workflow_job_id} has not spawned all slice jobs "
+                               f"after {timeout} seconds."
+                }
+            deadline_sleep(poll_interval, f"waiting for the slices of workflow_jobs {workflow_job_id}")
+
+    def follow_slices(self, workflow_job_id: int = None, max_workers: int = None,
+                      poll_interval: float = 2.0, timeout: float = 0) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Follow every slice job of a sliced job template concurrently, once all slices are finished the status,
+        timing and host summaries are combined into one result.
+        :param workflow_job_id:
+            id of the workflow job returned by job_launch.
+        :param max_workers:
+            number of slice jobs followed concurrently, default is one thread per slice.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up waiting on each slice, 0 waits forever.
+        :return:
+            Dictionary of the workflow job status, every slice result and the merged host summaries.
+        """
+        slices = self.slice_jobs(workflow_job_id=workflow_job_id, poll_interval=poll_interval, timeout=timeout)
+        if slices["status"] != "success":
+            return slices
+        with DeadlineExecutor(max_workers=max_workers or len(slices["jobs"])) as executor:
+            futures = [executor.submit(self.follow_job, job_id=job, poll_interval=poll_interval, timeout=timeout)
+                       for job in slices["jobs"]]
+            results = [future.result() for future in futures]
+        # Every slice is finished, the workflow job follows almost immediately.
+        workflow = self.wait_job(job_id=workflow_job_id, resource="workflow_jobs",
+                                 poll_interval=poll_interval, timeout=timeout)
+        if workflow["status"] != "success":
+            workflow.update({"workflow_job": workflow_job_id, "slices": results})
+            return workflow
+        summaries = [summary for result in results for summary in result.get("host_summaries", [])]
+        return {
+            "status": "success" if all(result["status"] == "success" for result in results) else "failed",
+            "workflow_job": workflow_job_id,
+            "job_status": workflow["job"].get("status"),
+            "started": workflow["job"].get("started"),
+            "finished": workflow["job"].get("finished"),
+            "elapsed": workflow["job"].get("elapsed"),
+            "slices": results,
+            "host_summaries": summaries,
+            "summary": self.merge_host_summaries(summaries)
+        }
+
+    def job_launch_follow(self, job_id: Union[str, int] = None, extra_vars: Dict = None, limit: str = None,
+                          wait: bool = True, max_workers: int = None, poll_interval: float = 2.0,
+                          timeout: float = 0) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Launch a job template and follow the launched job until it finishes.
+        If the job template is sliced (job_slice_count > 1) AWX launches a workflow job, in that case all
+        slice jobs are followed and combined with follow_slices.
+        :param job_id:
+            job template name or id.
+        :param extra_vars:
+            extra variables for the playbook.
+        :param limit:
+            host pattern, job template must have ask_limit_on_launch.
+        :param wait:
+            if False return right after launching.
+        :param max_workers:
+            number of slice jobs followed concurrently.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up waiting, 0 waits forever.
+        :return:
+            Dictionary of the launched job, and its result if wait is True.
+        """
+        response = self.job_launch(job_id=job_id, extra_vars=extra_vars, limit=limit)
+        if response["status"] != 201:
+            return {
+                "status": "failed",
+                "limit": limit,
+                "message": response.get("response", response.get("message"))
+            }
+        launched = response["response"]
+        if response.get("sliced"):
+            result = {
+                "status": "success",
+                "limit": limit,
+                "workflow_job": response["workflow_job"]
+            }
+            if wait:
+                result.update(self.follow_slices(workflow_job_id=response["workflow_job"],
+                                                 max_workers=max_workers,
+                                                 poll_interval=poll_interval,
+                                                 timeout=timeout))
+            return result
+        result = {
+            "status": "success",
+            "limit": limit,
+            "job": launched.get("job", launched.get("id"))
+        }
+        if wait:
+            result.update(self.follow_job(job_id=result["job"], poll_interval=poll_interval, timeout=timeout))
+        return result
+
+    def sharded_job_launch(self, job_id: Union[str, int] = None, shards: int = 2, extra_vars: Dict = None,
+                           max_workers: int = None, wait: bool = True, poll_interval: float = 2.0,
+                           timeout: float = 0) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Split the hosts of the job template inventory into shards and launch one job per shard by using limit,
+        so that a large run is spread across the AWX nodes instead of running as one huge job.
+        The job template must have ask_limit_on_launch enabled.
+        :param job_id:
+            job template name or id.
+        :param shards:
+            number of host batches, each batch is one job.
+        :param extra_vars:
+            extra variables sent to every shard.
+        :param max_workers:
+            number of shards launched and followed concurrently, default is one thread per shard.
+        :param wait:
+            if True wait for every shard to finish and merge their host summaries.
+        :param poll_interval:
+            seconds between each poll of a shard.
+        :param timeout:
+            seconds to give up waiting on each shard, 0 waits forever.
+        :return:
+            Dictionary of every shard result and the aggregated host summaries. uncovered lists the hosts which were
+            not launched because their name is read as a host pattern, see limit_unsafe.
+        """
+        if isinstance(job_id, str):
+            response = self.find_resource_id(resource="job_templates", name=job_id)
+            if response.get("found"):
+                job_id = response.get("result")
+            else:
+                return {
+                    "status": "failed",
+                    "message": f"{job_id} cannot be found."
+                }
+        elif not isinstance(job_id, int):
+            return {
+                "status": "failed",
+                "message": "job_id cannot be none."
+            }
+        if shards < 1:
+            return {
+                "status": "failed",
+                "message": "shards must be at least 1."
+            }
+        is_https_status, base_url = self.get_api_url()
+        response = self.get_request(base_url + f"/v2/job_templates/{job_id}/", is_https_status)
+        if response["status"] != 200:
+            return {
+                "status": "failed",
+                "message": response["response"]
+            }
+        job_template = response["response"]
+        if not job_template.get("ask_limit_on_launch"):
+            return {
+                "status": "failed",
+                "message": f"Job template {job_id} does not have ask_limit_on_launch enabled."
+            }
+        if job_template.get("inventory") is None:
+            # prompt on launch, there is no inventory to split into shards.
+            return {
+                "status": "failed",
+                "message": f"Job template {job_id} has no inventory, it prompts for one on launch."
+            }
+        hosts_response = self.get_all_pages(api_uri=f"/v2/inventories/{job_template.get('inventory')}/hosts/",
+                                            params={"order_by": "name"})
+        if hosts_response["status"] != "success":
+            return hosts_response
+        hosts = list()
+        uncovered = list()
+        for host in hosts_response["results"]:
+            # a limit cannot escape a host pattern, such a host would be split, expanded or excluded.
+            (uncovered if limit_unsafe(host["name"]) else hosts).append(host["name"])
+        if not hosts:
+            return {
+                "status": "failed",
+                "message": f"Inventory {job_template.get('inventory')} has no hosts which can be put in a limit.",
+                "uncovered": uncovered
+            }
+        # Contiguous batches of almost equal size, there is no empty batch if shards is more than hosts.
+        shards = min(shards, len(hosts))
+        size, remainder = divmod(len(hosts), shards)
+        batches = list()
+        start = 0
+        for index in range(shards):
+            end = start + size + (1 if index < remainder else 0)
+            batches.append(hosts[start:end])
+            start = end
+
+        start = time.monotonic()
+        with DeadlineExecutor(max_workers=max_workers or shards) as executor:
+            futures = [executor.submit(self.job_launch_follow, job_id=job_id, extra_vars=extra_vars,
+                                       limit=",".join(batch), wait=wait, poll_interval=poll_interval,
+                                       timeout=timeout) for batch in batches]
+            # Keep the shards in the order of the batches.
+            results = [future.result() for future in futures]
+        sharded = {
+            "status": "success" if all(result["status"] == "success" for result in results) else "failed",
+            "shards": results,
+            "uncovered": uncovered
+        }
+        if wait:
+            summaries = [summary for result in results for summary in result.get("host_summaries", [])]
+            sharded.update(
+                {
+                    "job_status": "successful" if all(result.get("job_status") == "successful"
+                                                      for result in results) else "failed",
+                    "elapsed": time.monotonic() - start,
+                    "summary": self.merge_host_summaries(summaries)
+                }
+            )
+        return sharded
+
+    def job_relaunch(self, job_id: int = None, hosts: str = "failed") -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Relaunch a finished job through /api/v2/jobs/{id}/relaunch/, with hosts="failed" only the hosts which
+        failed or were unreachable in the original job are targeted.
+        :param job_id:
+            id of the finished job, not the job template id.
+        :param hosts:
+            all or failed.
+        :return:
+            Dictionary of response threw up by post_request method, the response is the new job.
+        """
+        if hosts not in ("all", "failed"):
+            return {
+                "status": "failed",
+                "status_code": 400,
+                "message": f"Unrecognized hosts {hosts}, supported ones are all and failed."
+            }
+        if not isinstance(job_id, int):
+            return {
+                "status": "failed",
+                "message": "job_id must be an integer."
+            }
+        is_https_status, base_url = self.get_api_url()
+        url = base_url + f"/v2/jobs/{job_id}/relaunch/"
+        return self.post_request(url, is_https_status, {"hosts": hosts})
+
+    def _relaunch_and_follow(self, job_id: int = None, hosts: str = "failed", wait: bool = False,
+                             poll_interval: float = 2.0, timeout: float = 0) -> Dict[str, Any]:
+        """
+        Worker of job_relaunch_many, relaunch one job and optionally follow the new job.
+        """
+        response = self.job_relaunch(job_id=job_id, hosts=hosts)
+        if response["status"] != 201:
+            return {
+                "status": "failed",
+                "relaunched_from": job_id,
+                "message": response.get("response", response.get("message"))
+            }
+        result = {
+            "status": "success",
+            "relaunched_from": job_id,
+            "job": response["response"].get("id")
+        }
+        if wait:
+            result.update(self.follow_job(job_id=result["job"], poll_interval=poll_interval, timeout=timeout))
+        return result
+
+    def job_relaunch_many(self, job_ids: List[int] = None, hosts: str = "failed", wait: bool = False,
+                          max_workers: int = 8, poll_interval: float = 2.0,
+                          timeout: float = 0) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Relaunch several finished jobs concurrently, by default only their failed hosts are relaunched.
+        :param job_ids:
+            list of job ids.
+        :param hosts:
+            all or failed.
+        :param wait:
+            if True follow every relaunched job until it finishes and merge the host summaries.
+        :param max_workers:
+            number of jobs relaunched and followed concurrently.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up waiting on each job, 0 waits forever.
+        :return:
+            Dictionary of every relaunch result keyed by the original job id.
+        """
+        if not job_ids:
+            return {
+                "status": "failed",
+                "message": "job_ids cannot be empty."
+            }
+        with DeadlineExecutor(max_workers=max_workers) as executor:
+            futures = {job_id: executor.submit(self._relaunch_and_follow, job_id=job_id, hosts=hosts, wait=wait,
+                                               poll_interval=poll_interval, timeout=timeout) for job_id in job_ids}
+            results = {job_id: future.result() for job_id, future in futures.items()}
+        relaunched = {
+            "status": "success" if all(result["status"] == "success" for result in results.values()) else "failed",
+            "jobs": results
+        }
+        if wait:
+            summaries = [summary for result in results.values() for summary in result.get("host_summaries", [])]
+            relaunched.update({"summary": self.merge_host_summaries(summaries)})
+        return relaunched
+
+    def stream_events(self, job_id: int = None, resource: str = "jobs", poll_interval: float = 2.0,
+                      timeout: float = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Incrementally stream the events of a job while it is running, only events newer than the last one seen
+        are requested on each poll (id__gt), so a long job is never read from the beginning again.
+        :param job_id:
+            id of the job.
+        :param resource:
+            jobs or ad_hoc_commands, see EVENTS_CHILD for others.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up streaming, 0 waits forever.
+        :return:
+            Generator of events, if the request fails a dictionary with status failed is yielded and the
+            generator ends.
+        """
+        if resource not in EVENTS_CHILD:
+            yield {
+                "status": "failed",
+                "message": f"Unrecognized resource {resource}, supported ones are {', '.join(EVENTS_CHILD)}."
+            }
+            return
+        is_https_status, base_url = self.get_api_url()
+        url = base_url + f"/v2/{resource}/{job_id}/"
+        last_id = 0
+        start = time.monotonic()
+        while True:
+            # Check the status before collecting events, so the events emitted before finishing are not missed.
+            response = self.get_request(url, is_https_status)
+            if response["status"] != 200:
+                yield {
+                    "status": "failed",
+                    "message": response["response"]
+                }
+                return
+            finished = response["response"].get("status") in JOB_FINISHED_STATUS
+            events = self.get_all_pages(api_uri=f"/v2/{resource}/{job_id}/{EVENTS_CHILD[resource]}/",
+                                        params={"id__gt": last_id, "order_by": "id"})
+            for event in events["results"]:
+                last_id = event.get("id", last_id)
+                yield event
+            if events["status"] != "success":
+                yield events
+                return
+            if finished:
+                return
+            if 0 < timeout <= time.monotonic() - start:
+                yield {
+                    "status": "failed",
+                    "message": f"{resource} {job_id} is still {response['response'].get('status')} "
+                               f"after {timeout} seconds."
+                }
+                return
+            deadline_sleep(poll_interval, f"streaming the events of {resource} {job_id}")
+
+    def ad_hoc_command(self, inv_id: Union[str, int] = None, module_name: str = "command", module_args: str = "",
+                       limit: str = None, forks: int = 0, credential: Union[str, int] = None,
+                       job_type: str = "run", verbosity: Union[str, int] = 0, become_enabled: bool = False,
+                       extra_vars: Dict = None) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Run an ansible module against an inventory without a job template or project.
+        :param inv_id:
+            This can be a name in string or id, this refers to the inventory.
+        :param module_name:
+            ansible module such as command, shell, ping, setup.
+        :param module_args:
+            arguments of the module, e.g. "uptime" for the command module.
+        :param limit:
+            host pattern which restricts the hosts of the inventory.
+        :param forks:
+            0 uses the ansible default.
+        :param credential:
+            machine credential name or id, AWX requires one to reach the hosts.
+        :param job_type:
+            run or check.
+        :param verbosity:
+            string or int, see VERBOSITY.
+        :param become_enabled:
+        :param extra_vars:
+        :return:
+            Dictionary of response threw up by post_request method, the response is the ad hoc command.
+        """
+        payload = {
+            "job_type": job_type,
+            "module_name": module_name,
+            "module_args": module_args,
+            "forks": forks,
+            "become_enabled": become_enabled,
+            "limit": "" if limit is None else limit
+        }
+        if extra_vars is not None:
+            payload.update({"extra_vars": json.dumps(extra_vars)})
+        if isinstance(verbosity, str):
+            payload.update({"verbosity": VERBOSITY[verbosity.lower()]})
+        elif isinstance(verbosity, int) and 0 <= verbosity <= 5:
+            payload.update({"verbosity": verbosity})
+        if isinstance(inv_id, str):
+            inv_response = self.find_resource_id(resource="inventories", name=inv_id)
+            if inv_response.get("found"):
+                payload.update({"inventory": inv_response.get("result")})
+            else:
+                return inv_response
+        elif isinstance(inv_id, int):
+            payload.update({"inventory": inv_id})
+        else:
+            return {
+                "status": "failed",
+                "message": "inv_id must be either string or integer."
+            }
+        if isinstance(credential, str):
+            cred_response = self.find_resource_id(resource="credentials", name=credential)
+            if cred_response.get("found"):
+                payload.update({"credential": cred_response.get("result")})
+            else:
+                return cred_response
+        elif isinstance(credential, int):
+            payload.update({"credential": credential})
+        is_https_status, base_url = self.get_api_url()
+        url = base_url + "/v2/ad_hoc_commands/"
         return self.post_request(url, is_https_status, payload)
 
+    def ad_hoc_command_many(self, commands: List[Dict[str, Any]] = None,
+                            max_workers: int = 8) -> Union[Dict[str, str], Dict[str, List]]:
+        """
+        Launch many ad hoc commands concurrently, e.g. the same check across several inventories.
+        :param commands:
+            list of dictionaries, each dictionary is the keyword arguments of ad_hoc_command.
+        :param max_workers:
+            number of ad hoc commands launched concurrently.
+        :return:
+            Dictionary with results, the ad_hoc_command responses in the same order as commands.
+        """
+        if not commands:
+            return {
+                "status": "failed",
+                "message": "commands cannot be empty."
+            }
+        with DeadlineExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.ad_hoc_command, **command) for command in commands]
+            results = [future.result() for future in futures]
+        return {
+            "status": "success" if all(result.get("status") == 201 for result in results) else "failed",
+            "results": results
+        }
+
+    def _ad_hoc_command_worker(self, index: int, command: Dict[str, Any], events: Queue,
+                               poll_interval: float, timeout: float):
+        """
+        Worker of ad_hoc_command_stream, launch one ad hoc command and put its events into the shared queue.
+        The last item, the one with status, is put whatever happens as ad_hoc_command_stream waits for it.
+        """
+        start = time.monotonic()
+        result = {"index": index, "status": "failed"}
+        try:
+            response = self.ad_hoc_command(**command)
+            if response.get("status") != 201:
+                result.update({"message": response.get("response", response.get("message"))})
+                return
+            command_id = response["response"].get("id")
+            result.update({"ad_hoc_command": command_id})
+            for event in self.stream_events(job_id=command_id, resource="ad_hoc_commands",
+                                            poll_interval=poll_interval, timeout=timeout):
+                events.put({"index": index, "ad_hoc_command": command_id, "event": event})
+            # timeout covers streaming and waiting together, wait_job only gets what is left of it.
+            left = max(timeout - (time.monotonic() - start), 0.001) if timeout > 0 else 0
+            job = self.wait_job(job_id=command_id, resource="ad_hoc_commands", poll_interval=poll_interval,
+                                timeout=left)
+            result.update({"status": job["status"], "job_status": job.get("job", dict()).get("status")})
+        except DeadlineExceeded as e:
+            result.update(e.to_dict())
+        except Exception as e:
+            result.update({"message": f"{type(e).__name__}: {e}"})
+        finally:
+            events.put(result)
+
+    def ad_hoc_command_stream(self, commands: List[Dict[str, Any]] = None, max_workers: int = 8,
+                              poll_interval: float = 2.0, timeout: float = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Launch many ad hoc commands concurrently and stream their events back as they arrive.
+        Every item yielded has index which is the position of the command in commands, an item with "event" is an
+        event of the ad hoc command, an item with "status" is the last item of that command.
+        :param commands:
+            list of dictionaries, each dictionary is the keyword arguments of ad_hoc_command.
+        :param max_workers:
+            number of ad hoc commands launched and followed concurrently.
+        :param poll_interval:
+            seconds between each poll.
+        :param timeout:
+            seconds to give up following each command, 0 waits forever.
+        :return:
+            Generator of events and final status of every ad hoc command. A command which runs out of the deadline
+            of the caller ends with status timeout, if the deadline is cancelled or over while no item is coming
+            DeadlineExceeded is raised, its partial has the indexes of the commands which did not end.
+        """
+        if not commands:
+            return
+        events = Queue()
+        executor = DeadlineExecutor(max_workers=max_workers)
+        # Every command puts exactly one item with status as its last item.
+        pending = set(range(len(commands)))
+        # the workers run under their own token, inside the deadline of the caller, so they can be stopped.
+        workers = Deadline()
+        try:
+            with workers:
+                for index, command in enumerate(commands):
+                    executor.submit(self._ad_hoc_command_worker, index, command, events, poll_interval, timeout)
+            deadline = current_deadline()
+            expired_at = None
+            while pending:
+                try:
+                    item = events.get(timeout=0.1 if deadline is not None else None)
+                except Empty:
+                    if not deadline.expired():
+                        continue
+                    # the workers share the deadline and put their timeout items, unless they are stuck.
+                    expired_at = expired_at if expired_at is not None else time.monotonic()
+                    if time.monotonic() - expired_at > CLEANUP_TIMEOUT:
+                        raise deadline.exceeded(f"waiting for {len(pending)} ad hoc commands",
+                                                partial={"pending": sorted(pending)})
+                    continue
+                if "status" in item:
+                    pending.discard(item["index"])
+                yield item
+        finally:
+            if pending:
+                # the caller has given up, such as break or close of the generator, the workers stop at their next
+                # request or poll instead of following the commands until AWX finishes them.
+                workers.cancel()
+            executor.shutdown(wait=not pending)
+
+    def clone_resource(self, resource: str = "job_templates", resource_id: Union[str, int] = None,
+                       name: str = None, changes: Dict[str, Any] = None) -> Union[Dict[str, str], Dict[str, Any]]:
+        """
+        Clone a resource server side with /api/v2/{resource}/{id}/copy/, then PATCH only the fields in changes
+        which are different from the copy. This is much cheaper than the create methods as the inventory, project
+        and credentials of the source are not looked up and validated again.
+        :param resource:
+            job_templates, projects, inventories or credentials.
+        :param resource_id:
+            name or id of the source resource.
+        :param name:
+            name of the copy, this is required.
+        :param changes:
+            fields of the copy to be modified, e.g. {"limit": "fw03", "extra_vars": "{}"}
+        :return:
+            Dictionary of response, the response is the copied resource after the PATCH. If the PATCH fails the
+            copy is deleted, copy_id and copy_deleted tell which copy and whether it is gone.
+        """
+        if resource not in COPYABLE_RESOURCES:
+            return {
+                "status": "failed",
+                "status_code": 400,
+                "message": f"Unrecognized resource {resource}, supported ones are {', '.join(COPYABLE_RESOURCES)}."
+            }
+        if name is None:
+            return {
+                "status": "failed",
+                "status_code": 400,
+                "message": "name of the copy is required."
+            }
+        if isinstance(resource_id, str):
+            find_response = self.find_resource_id(resource=resource, name=resource_id)
+            if find_response.get("found"):
+                resource_id = find_response.get("result")
+            else:
+                return find_response
+        elif not isinstance(resource_id, int):
+            return {
+                "status": "failed",
+                "message": "resource_id must be either string or integer."
+            }
+        is_https_status, base_url = self.get_api_url()
+        response = self.post_request(base_url + f"/v2/{resource}/{resource_id}/copy/", is_https_status,
+                                     {"name": name})
+        if response["status"] != 201 or not changes:
+            return response
+        copied = response["response"]
+        # Only send the fields which the copy does not already have.
+        payload = {k: v for k, v in changes.items() if copied.get(k) != v}
+        if not payload:
+            return response
+        patch_response = self.patch_request(base_url + f"/v2/{resource}/{copied.get('id')}/", is_https_status,
+                                            payload)
+        if patch_response["status"] != 200:
+            # a copy without its changes is not what was asked for, remove it so the same name can be used again.
+            delete_response = self.delete_request(resource_id=copied.get("id"), resource=resource)
+            patch_response.update(
+                {
+                    "copy_id": copied.get("id"),
+                    "copy_deleted": delete_response.get("status") == "success"
+                }
+            )
+        return patch_response
+
+    def clone_many(self, resource: str = "job_templates", resource_id: Union[str, int] = None,
+                   clones: List[Dict[str, Any]] = None,
+                   max_workers: int = 8) -> Union[Dict[str, str], Dict[str, List]]:
+        """
+        Clone one resource many times concurrently with a bounded pool of threads.
+        :param resource:
+            job_templates, projects, inventories or credentials.
+        :param resource_id:
+            name or id of the source resource, the name is looked up once for all clones.
+        :param clones:
+            list of dictionaries with name and optional changes, see clone_resource.
+        :param max_workers:
+            number of clones created concurrently.
+        :return:
+            Dictionary with results, the clone_resource responses in the same order as clones.
+        """
+        if not clones:
+            return {
+                "status": "failed",
+                "message": "clones cannot be empty."
+            }
+        if isinstance(resource_id, str):
+            find_response = self.find_resource_id(resource=resource, name=resource_id)
+            if find_response.get("found"):
+                resource_id = find_response.get("result")
+            else:
+                return find_response
+        with DeadlineExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.clone_resource, resource=resource, resource_id=resource_id,
+                                       name=clone.get("name"), changes=clone.get("changes"))
+                       for clone in clones]
+            results = [future.result() for future in futures]
+        return {
+            "status": "success" if all(result.get("status") in (200, 201) for result in results) else "failed",
+            "results": results
+        }
+
     def create_job_templates_cred(self,
                                   cred_id: Union[str, int] = None,
                                   desc: str = None,
@@ -1044,10 +2594,9 @@ class Tower:
                 return self.post_request(url, is_https_status, add_cred_payload)
         elif isinstance(cred_id, int):
             # if cred_id is supplied, no need to put name for this method, as this method will find out
-            # the name of the cred_id.
-            response = self.get_resource_info(resource="credentials", resource_id=cred_id)
-            if response.status_code == 200:
-                cred_name = response.json().get("name")
+            # the name of the cred_id, usually from a summary_fields already seen without another GET.
+            cred_name = self.resolve_name("credentials", cred_id)
+            if cred_name is not None:
                 add_cred_payload = {
                     "name": cred_name if name is None else name,
                     "id": cred_id
@@ -1070,8 +2619,7 @@ class Tower:
                     "message": f"The org_id {org_id} cannot be found."
                 }
         elif isinstance(org_id, int):
-            find_org_response = self.get_resource_info(resource="organizations", resource_id=org_id)
-            if find_org_response.status_code == 200:
+            if self.resolve_name("organizations", org_id) is not None:
                 payload.update(
                     {
                         "organization": org_id
@@ -1099,7 +2647,7 @@ class Tower:
                         # it is possible inputs is an empty dict when the inputs does not have required keys.
                         payload.update(
                             {
-                                "credential_type": CREDENTIAL_TYPES[credential_type.lower()],
+                                "credential_type": self.credential_type_id(credential_type),
                                 "inputs": inputs
                             }
                         )
@@ -1127,7 +2675,7 @@ class Tower:
                     inputs = inputs_validator(inputs, NET_INPUTS)
                     payload.update(
                         {
-                            "credential_type": CREDENTIAL_TYPES[credential_type.lower()],
+                            "credential_type": self.credential_type_id(credential_type),
                             "inputs": inputs
                         }
                     )
@@ -1142,7 +2690,8 @@ class Tower:
                     }
             elif credential_type.lower() == "aws":
                 """
-                    This is best effort validation. I realize even if there is only username in inputs Ansible AWX accepts.
+                    This is best effort validation. I realize even if there is only username in inputs Ansible AWX
+                    accepts.
                     This code block ensures username, password and security_token are available, all other invalid keys
                     are removed.
                     """
@@ -1161,7 +2710,7 @@ class Tower:
                     }
                 payload.update(
                     {
-                        "credential_type": CREDENTIAL_TYPES[credential_type.lower()],
+                        "credential_type": self.credential_type_id(credential_type),
                         "inputs": inputs
                     }
                 )
@@ -1180,7 +2729,7 @@ class Tower:
                     }
                 payload.update(
                     {
-                        "credential_type": CREDENTIAL_TYPES[credential_type.lower()],
+                        "credential_type": self.credential_type_id(credential_type),
                         "inputs": inputs
                     }
                 )
@@ -1216,7 +2765,7 @@ class Tower:
                     }
                 payload.update(
                     {
-                        "credential_type": CREDENTIAL_TYPES[credential_type.lower()],
+                        "credential_type": self.credential_type_id(credential_type),
                         "inputs": inputs
                     }
                 )
@@ -1233,7 +2782,7 @@ class Tower:
                     }
                 payload.update(
                     {
-                        "credential_type": CREDENTIAL_TYPES[credential_type.lower()],
+                        "credential_type": self.credential_type_id(credential_type),
                         "inputs": inputs
                     }
                 )
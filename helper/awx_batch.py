@@ -0,0 +1,224 @@
+"""
+Batch of operations on Ansible AWX, used by the --batch mode of commands/tower.py.
+Each operation is one json object per line (NDJSON), they are run concurrently over one pooled Tower session and
+one result per operation is yielded as soon as it is done, the results are not in the order of the operations,
+use line or ref to match them.
+
+{"op": "get", "resource": "organizations", "name": "Default"}
+{"op": "get", "resource": "job_templates", "id": 7}
+{"op": "create", "resource": "inventories", "payload": {"name": "lab", "organization": 1}, "ref": "lab-inv"}
+{"op": "delete", "resource": "hosts", "name": "192.168.1.10"}
+{"op": "get", "resource": "projects", "name": "lab", "deadline": 5}
+
+deadline is the number of seconds the operation has, lookups included, the result of an operation which runs out of
+time has the status timeout and the progress it made.
+"""
+from concurrent.futures import Future
+from queue import Queue
+from threading import Event, Semaphore, Thread
+from typing import Dict, Any, Iterable, Iterator
+import json
+
+from helper.deadline import Deadline, DeadlineExceeded, DeadlineExecutor, bind
+
+OPERATIONS = ("get", "create", "delete")
+
+
+def resolve_id(tower, resource: str, name: str) -> Dict[str, Any]:
+    """
+    Find the id by the exact name, unlike Tower.find_resource_id the name is filtered by Ansible AWX,
+    so the resource does not need to be on the first page.
+    :return:
+        dictionary with status and id, cached is True if the id comes from the id cache or the disk cache.
+    """
+    resource_id = tower.cached_id(resource, name)
+    if resource_id is not None:
+        return {
+            "status": "success",
+            "id": resource_id,
+            "cached": True
+        }
+    is_https_status, base_url = tower.get_api_url()
+    response = tower.get_request(f"{base_url}/v2/{resource}/", is_https_status, params={"name": name})
+    if response["status"] != 200:
+        return {
+            "status": "failed",
+            "message": response["response"]
+        }
+    results = response["response"].get("results", [])
+    if len(results) != 1:
+        return {
+            "status": "failed",
+            "message": f"{len(results)} {resource} named {name} found, use id instead."
+        }
+    tower.remember_id(resource, name, results[0]["id"], modified=results[0].get("modified"))
+    return {
+        "status": "success",
+        "id": results[0]["id"]
+    }
+
+
+def run_operation(tower, operation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run one operation.
+    :param tower:
+        Tower instance, preferably with an opened session.
+    :param operation:
+        dictionary of op, resource, and either id or name, create requires payload instead.
+    :return:
+        dictionary with status, and id and result if the operation succeeds or message if it fails.
+    """
+    op = operation.get("op")
+    resource = operation.get("resource")
+    if op not in OPERATIONS or not resource:
+        return {
+            "status": "failed",
+            "message": f"op must be one of {', '.join(OPERATIONS)} and resource is required."
+        }
+    is_https_status, base_url = tower.get_api_url()
+    if op == "create":
+        response = tower.post_request(f"{base_url}/v2/{resource}/", is_https_status, operation.get("payload", {}))
+        if response["status"] != 201:
+            return {
+                "status": "failed",
+                "message": response["response"]
+            }
+        return {
+            "status": "success",
+            "id": response["response"].get("id"),
+            "result": response["response"]
+        }
+
+    cached = False
+    resource_id = operation.get("id")
+    if resource_id is None:
+        if operation.get("name") is None:
+            return {
+                "status": "failed",
+                "message": "Either id or name is required."
+            }
+        found = resolve_id(tower, resource, operation["name"])
+        if found["status"] != "success":
+            return found
+        resource_id = found["id"]
+        cached = found.get("cached", False)
+    if op == "delete":
+        response = tower.delete_request(resource_id=resource_id, resource=resource)
+        if cached and response.get("status") != "success":
+            # the resource could have been deleted or renamed by someone else, look it up once more.
+            tower.forget_id(resource, resource_id)
+            return run_operation(tower, operation)
+        response.update({"id": resource_id})
+        return response
+    response = tower.get_request(f"{base_url}/v2/{resource}/{resource_id}/", is_https_status)
+    if cached and response["status"] == 404:
+        tower.forget_id(resource, resource_id)
+        return run_operation(tower, operation)
+    if response["status"] != 200:
+        return {
+            "status": "failed",
+            "id": resource_id,
+            "message": response["response"]
+        }
+    return {
+        "status": "success",
+        "id": resource_id,
+        "result": response["response"]
+    }
+
+
+def _run_line(tower, line_number: int, operation: Dict[str, Any], deadline: float = None) -> Dict[str, Any]:
+    result = {
+        "line": line_number,
+        "op": operation.get("op"),
+        "resource": operation.get("resource")
+    }
+    if "ref" in operation:
+        result.update({"ref": operation["ref"]})
+    try:
+        with Deadline(operation.get("deadline", deadline)):
+            result.update(run_operation(tower, operation))
+    except DeadlineExceeded as e:
+        result.update(e.to_dict())
+    except Exception as e:
+        # one broken operation must not stop the batch.
+        result.update({"status": "failed", "message": f"{type(e).__name__}: {e}"})
+    return result
+
+
+def run_batch(tower, lines: Iterable[str], max_workers: int = 8,
+              deadline: float = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run the NDJSON operations concurrently and yield the results as they are done.
+    The lines are read lazily by a reader thread and only a few operations are queued ahead of the workers, so a
+    batch read from stdin starts at once, every result is yielded as soon as it is done even while the reader waits
+    for the next line, and an endless batch uses constant memory.
+    :param tower:
+        Tower instance, preferably with an opened session of pool_maxsize max_workers.
+    :param lines:
+        iterable of json strings, such as a file or sys.stdin, blank lines are skipped.
+    :param max_workers:
+        number of operations running concurrently.
+    :param deadline:
+        seconds each operation has unless the operation sets its own deadline, None for no limit. A deadline
+        active when run_batch is called also bounds every operation, cancelling it stops the whole batch.
+    :return:
+        generator of results, each result has the line number of its operation.
+    """
+    results = Queue()
+    slots = Semaphore(max_workers * 2)
+    stopped = Event()
+    executor = DeadlineExecutor(max_workers=max_workers)
+
+    def read():
+        submitted = 0
+        try:
+            for line_number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    operation = json.loads(line)
+                    if not isinstance(operation, dict):
+                        raise ValueError("operation must be a json object.")
+                except ValueError as e:
+                    results.put({
+                        "line": line_number,
+                        "status": "failed",
+                        "message": f"Invalid operation: {e}"
+                    })
+                    continue
+                # wait for a free slot, and give up if the caller has stopped reading the results.
+                while not slots.acquire(timeout=0.1):
+                    if stopped.is_set():
+                        return
+                if stopped.is_set():
+                    return
+                executor.submit(_run_line, tower, line_number, operation, deadline).add_done_callback(results.put)
+                submitted += 1
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(("eof", submitted))
+
+    # the reader submits, so it runs under the deadline of the caller.
+    reader = Thread(target=bind(read), daemon=True)
+    reader.start()
+    received = 0
+    submitted = None
+    try:
+        while submitted is None or received < submitted:
+            item = results.get()
+            if isinstance(item, Future):
+                received += 1
+                # the slot is free once the result is taken, so a slow reader of the results holds the batch back.
+                slots.release()
+                yield item.result()
+            elif isinstance(item, tuple):
+                submitted = item[1]
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stopped.set()
+        executor.shutdown(wait=True)
@@ -0,0 +1,113 @@
+"""
+Persistent cache of lookups on Ansible AWX shared by every process of the same user, such as commands/tower.py run
+from a shell loop and the example scripts: the scheme of the server, the credential type ids and the name to id
+mappings. One sqlite file per AWX host and user, sqlite keeps it safe when several processes read and write it.
+
+Entries are not trusted blindly, the name to id mappings keep the modified timestamp of the AWX object and are
+validated against it, see Tower.cached_id.
+"""
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".ansible_api", "awx_cache")
+
+# The scheme of the server is probed again after this number of seconds, a scheme is only stored once the server
+# has answered on it.
+SCHEME_TTL = 86400
+
+# The credential type ids are read again after this number of seconds, such as after an upgrade of AWX.
+CREDENTIAL_TYPES_TTL = 86400
+
+# A name to id mapping validated within this number of seconds is trusted without asking AWX again.
+VALIDATE_AFTER = 60
+
+
+def cache_path(username: str, server_addr: str, server_port: int) -> str:
+    key = f"{username}@{server_addr}:{server_port}"
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".sqlite3")
+
+
+class AwxCache:
+    """
+    Key value store, the value is anything json can dump, modified is the modified timestamp of the AWX object
+    and checked is when the entry was last stored or validated.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            # readers do not wait for a writer in wal mode.
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, "
+                                     "modified TEXT, checked REAL)")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        :return:
+            dictionary of value, modified and age in seconds since checked, None if there is no entry.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value, modified, checked FROM entries WHERE key = ?",
+                                           (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {
+                "value": json.loads(row[0]),
+                "modified": row[1],
+                "age": time.time() - row[2]
+            }
+
+    def put(self, key: str, value: Any, modified: str = None):
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                                     (key, json.dumps(value), modified, time.time()))
+
+    def put_many(self, entries: List[Tuple[str, Any, Optional[str]]]):
+        """
+        Store many entries in one transaction, a list of (key, value, modified).
+        """
+        if not entries:
+            return
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                                         [(key, json.dumps(value), modified, now)
+                                          for key, value, modified in entries])
+
+    def touch(self, key: str):
+        """
+        The entry has been validated, trust it for another VALIDATE_AFTER seconds.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE entries SET checked = ? WHERE key = ?", (time.time(), key))
+
+    def delete(self, key: str):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def forget_value(self, prefix: str, value: Any):
+        """
+        Delete every entry under prefix with this value, such as all the names mapped to a deleted id.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ? AND value = ?",
+                                     (len(prefix), prefix, json.dumps(value)))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entries")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
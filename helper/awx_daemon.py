@@ -0,0 +1,243 @@
+"""
+Local daemon of commands/tower.py, it keeps one Tower session (pooled connections, the probed scheme, an OAuth2 token
+and the name to id cache) warm and listens on a unix socket, so a shell script which runs tower.py hundreds of times
+does not start from zero every time.
+The cli forwards its arguments to the daemon if one is running for the same username, host and port, otherwise the
+cli runs the command by itself.
+
+Only the standard library is imported here, the client side is on the start up path of the cli.
+
+Protocol, one json object per line:
+client -> daemon: {"argv": [...]} then the lines of stdin if the command reads stdin (--batch -).
+daemon -> client: {"out": "..."} for every line of output, then {"rc": exit code}.
+"""
+from threading import Thread, Lock
+from typing import Callable, List, Optional, TextIO
+import hashlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import time
+
+SOCKET_DIR = os.path.join(os.path.expanduser("~"), ".ansible_api", "daemon")
+
+# Exit the daemon after this number of seconds without any command.
+IDLE_TIMEOUT = 900
+
+
+def socket_path(username: str, server_addr: str, server_port: int) -> str:
+    """
+    One daemon per username, host and port, the socket name is the sha1 of the three.
+    """
+    key = f"{username}@{server_addr}:{server_port}"
+    return os.path.join(SOCKET_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".sock")
+
+
+class ClientOutput:
+    """
+    File like object given to the command as stdout, every complete line is sent to the client as it is written.
+    """
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.buffer = ""
+
+    def _send(self, message: dict):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def write(self, text: str) -> int:
+        self.buffer += text
+        if "\n" in self.buffer:
+            lines, _, self.buffer = self.buffer.rpartition("\n")
+            self._send({"out": lines + "\n"})
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            self._send({"out": self.buffer})
+            self.buffer = ""
+
+    def exit(self, rc: int):
+        self.flush()
+        self._send({"rc": rc})
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        server.begin()
+        try:
+            request = json.loads(self.rfile.readline() or b"{}")
+            output = ClientOutput(self.wfile)
+            if request.get("stop"):
+                output.exit(0)
+                Thread(target=server.shutdown, daemon=True).start()
+                return
+            stdin = io.TextIOWrapper(self.rfile, encoding="utf-8")
+            try:
+                rc = server.dispatch(request.get("argv", []), stdin, output)
+            except SystemExit as e:
+                # argparse exits on invalid arguments.
+                rc = e.code if isinstance(e.code, int) else 1
+            except Exception as e:
+                output.write(f"{type(e).__name__}: {e}\n")
+                rc = 1
+            output.exit(rc)
+        except (OSError, ValueError):
+            # the client has gone away or sent garbage, nothing to reply to.
+            pass
+        finally:
+            server.end()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, dispatch: Callable[[List[str], TextIO, ClientOutput], int]):
+        self.dispatch = dispatch
+        self.lock = Lock()
+        self.active = 0
+        self.last_used = time.monotonic()
+        super().__init__(path, _Handler)
+
+    def begin(self):
+        with self.lock:
+            self.active += 1
+            self.last_used = time.monotonic()
+
+    def end(self):
+        with self.lock:
+            self.active -= 1
+            self.last_used = time.monotonic()
+
+    def idle_for(self) -> float:
+        with self.lock:
+            return 0 if self.active else time.monotonic() - self.last_used
+
+
+def is_running(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def serve(path: str, dispatch: Callable[[List[str], TextIO, ClientOutput], int],
+          idle_timeout: float = IDLE_TIMEOUT) -> int:
+    """
+    Run the daemon in the foreground until it is stopped or idle for idle_timeout seconds.
+    :param path:
+        unix socket path, see socket_path.
+    :param dispatch:
+        function which runs one command, it receives argv, stdin and stdout and returns the exit code.
+    :param idle_timeout:
+        seconds without any command before the daemon exits, 0 to never exit.
+    :return:
+        exit code.
+    """
+    if is_running(path):
+        print(f"A daemon is already listening on {path}.", file=sys.stderr)
+        return 1
+    # Only the owner can reach the socket, the daemon acts with the credentials of the owner.
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    os.chmod(os.path.dirname(path), 0o700)
+    if os.path.exists(path):
+        # left behind by a daemon which did not exit cleanly.
+        os.remove(path)
+    old_umask = os.umask(0o177)
+    try:
+        server = DaemonServer(path, dispatch)
+    finally:
+        os.umask(old_umask)
+
+    def watch_idle():
+        while idle_timeout > 0:
+            time.sleep(min(1.0, idle_timeout))
+            if server.idle_for() >= idle_timeout:
+                server.shutdown()
+                return
+
+    Thread(target=watch_idle, daemon=True).start()
+    try:
+        server.serve_forever(poll_interval=0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+    return 0
+
+
+def forward(path: str, argv: List[str], stdin: TextIO = None, stdout: TextIO = None) -> Optional[int]:
+    """
+    Thin client, send the arguments to the daemon and copy its output to stdout.
+    :param path:
+        unix socket path, see socket_path.
+    :param argv:
+        arguments of tower.py.
+    :param stdin:
+        sent to the daemon if the command reads stdin.
+    :param stdout:
+        where the output of the command is written, default is sys.stdout.
+    :return:
+        exit code of the command, None if no daemon is running and the command should be run directly.
+    """
+    stdout = sys.stdout if stdout is None else stdout
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    with sock:
+        sock.sendall((json.dumps({"argv": argv}) + "\n").encode("utf-8"))
+
+        def send_stdin():
+            try:
+                if stdin is not None:
+                    for line in stdin:
+                        sock.sendall(line.encode("utf-8"))
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        # stdin is sent while the output is read, the daemon answers before the whole stdin is sent.
+        sender = Thread(target=send_stdin, daemon=True)
+        sender.start()
+        for line in sock.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if "out" in message:
+                stdout.write(message["out"])
+                stdout.flush()
+            elif "rc" in message:
+                return message["rc"]
+    # the daemon has gone away in the middle of the command, it may have been partly done so do not run it again.
+    print("The daemon closed the connection before the command finished.", file=sys.stderr)
+    return 1
+
+
+def stop(path: str) -> bool:
+    """
+    Ask the daemon to exit.
+    :return:
+        True if a daemon was running.
+    """
+    if not os.path.exists(path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall((json.dumps({"stop": True}) + "\n").encode("utf-8"))
+            sock.shutdown(socket.SHUT_WR)
+            sock.recv(64)
+        return True
+    except OSError:
+        return False
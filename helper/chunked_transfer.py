@@ -0,0 +1,316 @@
+"""
+Chunked sftp transfer, a large file is split into ranges and the ranges are moved over several sftp channels
+concurrently, each channel writes at the offset of its range.
+A manifest of the verified chunks is kept on the local disk, if the transfer is disconnected the next transfer of
+the same file only moves the chunks which are not in the manifest.
+
+Integrity is checked per chunk, which also covers the whole file as the chunks cover it end to end: the sha256 of
+every chunk is calculated on the remote server with one command which reads the file once, and compared with the
+sha256 of the same chunk of the local data. On upload the local sha256 is taken while the chunk is read from the local
+file, on download the downloaded file is hashed once after the transfer, so a chunk is never compared with itself.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, List, Tuple, Any, Callable
+import hashlib
+import json
+import os
+import shlex
+import time
+
+from paramiko import SFTPClient
+
+# Default size of each chunk.
+CHUNK_SIZE = 8388608
+
+# Size of each read/write within a chunk.
+BLOCK_SIZE = 1048576
+
+# Manifests are kept here, never in the source or destination directory of the user.
+MANIFEST_DIR = os.path.join(os.path.expanduser("~"), ".ansible_api", "transfers")
+
+
+def plan_chunks(file_size: int, chunk_size: int = CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split the file into ranges.
+    :param file_size:
+        size of the file in bytes.
+    :param chunk_size:
+        size of each chunk in bytes, the last chunk can be smaller.
+    :return:
+        list of (offset, length)
+    """
+    return [(offset, min(chunk_size, file_size - offset)) for offset in range(0, file_size, chunk_size)]
+
+
+def manifest_path(direction: str, hostname: str, local_path: str, remote_path: str) -> str:
+    """
+    The manifest file name is the sha1 of the transfer, so the same transfer always finds its manifest.
+    """
+    key = f"{direction}|{hostname}|{os.path.abspath(local_path)}|{remote_path}"
+    return os.path.join(MANIFEST_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def load_manifest(path: str, source: Dict[str, Any], chunk_size: int) -> Dict[str, Any]:
+    """
+    Load the manifest of a previous transfer, it is only trusted if the source file and the chunk size
+    are unchanged, otherwise a new manifest is started.
+    :param path:
+        manifest path.
+    :param source:
+        size and mtime of the source file.
+    :param chunk_size:
+        chunk size of this transfer.
+    :return:
+        manifest, done is a dictionary of chunk index (in string) to sha256.
+    """
+    try:
+        with open(path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("source") == source and manifest.get("chunk_size") == chunk_size:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {
+        "source": source,
+        "chunk_size": chunk_size,
+        "done": dict()
+    }
+
+
+def save_manifest(path: str, manifest: Dict[str, Any]):
+    """
+    Write the manifest to a temporary file and then replace, a disconnect never leaves a broken manifest.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(temp_path, path)
+
+
+def remote_chunk_hashes(ssh, remote_path: str, chunk_size: int, indexes: List[int]) -> Dict[str, Any]:
+    """
+    Calculate the sha256 of the chunks of the remote file with one remote command, every chunk is read once.
+    :param ssh:
+        LinuxSSH instance.
+    :param remote_path:
+        absolute path of the remote file.
+    :param chunk_size:
+        size of each chunk.
+    :param indexes:
+        chunk indexes to hash.
+    :return:
+        dictionary with chunks, a dictionary of chunk index (in string) to sha256.
+    """
+    path = shlex.quote(remote_path)
+    if indexes == list(range(len(indexes))):
+        # every chunk, the command stays short for a file of many chunks.
+        listed = f"$(seq 0 {len(indexes) - 1})"
+    else:
+        listed = " ".join(str(index) for index in indexes)
+    command = (f"for i in {listed}; do "
+               f"dd if={path} bs={chunk_size} skip=$i count=1 2>/dev/null | sha256sum | cut -d' ' -f1; "
+               f"done")
+    response = ssh.run_batch([command], sudo=False)
+    if response["status"] != "success":
+        return {
+            "status": "failed",
+            "message": response.get("message", response.get("results"))
+        }
+    digests = response["results"][0]["output"].split()
+    if len(digests) != len(indexes):
+        return {
+            "status": "failed",
+            "message": f"Expected {len(indexes)} digests from the remote server, got {len(digests)}."
+        }
+    return {
+        "status": "success",
+        "chunks": {str(index): digest for index, digest in zip(indexes, digests)}
+    }
+
+
+def local_chunk_hashes(local_path: str, chunk_size: int, indexes: List[int]) -> Dict[str, str]:
+    """
+    The local counterpart of remote_chunk_hashes.
+    :return:
+        dictionary of chunk index (in string) to sha256.
+    """
+    digests = dict()
+    with open(local_path, "rb") as local_file:
+        for index in indexes:
+            digest = hashlib.sha256()
+            local_file.seek(index * chunk_size)
+            remaining = chunk_size
+            while remaining > 0:
+                file_blocks = local_file.read(min(BLOCK_SIZE, remaining))
+                if not file_blocks:
+                    break
+                digest.update(file_blocks)
+                remaining -= len(file_blocks)
+            digests[str(index)] = digest.hexdigest()
+    return digests
+
+
+class ChunkedTransfer:
+    """
+    One transfer of one file, either upload or download.
+    """
+    def __init__(self, ssh, direction: str, local_path: str, remote_path: str,
+                 chunk_size: int = CHUNK_SIZE, channels: int = 4, resume: bool = True,
+                 callback: Callable[[int, int], Any] = None):
+        self.ssh = ssh
+        self.direction = direction
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.chunk_size = chunk_size
+        self.channels = channels
+        self.resume = resume
+        self.callback = callback
+        self.lock = Lock()
+        self.transferred = 0
+        self.file_size = 0
+        self.manifest = dict()
+        self.manifest_file = manifest_path(direction, ssh.hostname, local_path, remote_path)
+
+    def _progress(self, length: int):
+        with self.lock:
+            self.transferred += length
+            if self.callback is not None:
+                self.callback(self.transferred, self.file_size)
+
+    def _mark_done(self, index: int, digest: str):
+        with self.lock:
+            self.manifest["done"][str(index)] = digest
+            save_manifest(self.manifest_file, self.manifest)
+
+    def _move_chunks(self, chunks: List[Tuple[int, int, int]]):
+        """
+        Worker, one sftp channel per worker, each chunk is written at its offset.
+        """
+        sftp = SFTPClient.from_transport(self.ssh.get_transport())
+        try:
+            if self.direction == "upload":
+                with open(self.local_path, "rb") as source, sftp.open(self.remote_path, "r+b") as destination:
+                    destination.set_pipelined(True)
+                    self._copy(chunks, source, destination)
+            else:
+                with sftp.open(self.remote_path, "rb") as source, open(self.local_path, "r+b") as destination:
+                    self._copy(chunks, source, destination)
+        finally:
+            sftp.close()
+
+    def _copy(self, chunks: List[Tuple[int, int, int]], source, destination):
+        for index, offset, length in chunks:
+            digest = hashlib.sha256()
+            source.seek(offset)
+            destination.seek(offset)
+            remaining = length
+            while remaining > 0:
+                file_blocks = source.read(min(BLOCK_SIZE, remaining))
+                if not file_blocks:
+                    raise IOError(f"Unexpected end of file at offset {offset + length - remaining}.")
+                digest.update(file_blocks)
+                destination.write(file_blocks)
+                remaining -= len(file_blocks)
+                self._progress(len(file_blocks))
+            destination.flush()
+            self._mark_done(index, digest.hexdigest())
+
+    def _run(self, pending: List[Tuple[int, int, int]]):
+        """
+        Spread the pending chunks across the channels round robin.
+        """
+        workers = max(1, min(self.channels, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._move_chunks, pending[worker::workers]) for worker in range(workers)]
+            for future in futures:
+                future.result()
+
+    def start(self) -> Dict[str, Any]:
+        """
+        Transfer the file, verify every chunk and the file, resend the chunks which do not match once.
+        """
+        start = time.monotonic()
+        if self.direction == "upload":
+            stat = os.stat(self.local_path)
+        else:
+            with self.ssh.open_sftp() as sftp:
+                stat = sftp.stat(self.remote_path)
+        self.file_size = stat.st_size
+        source = {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+        if self.resume:
+            self.manifest = load_manifest(self.manifest_file, source, self.chunk_size)
+        else:
+            self.manifest = load_manifest("", source, self.chunk_size)
+        chunks = plan_chunks(self.file_size, self.chunk_size)
+        # Create the destination with its final size, so that every channel can write at its offset.
+        if self.direction == "upload":
+            with self.ssh.open_sftp() as sftp:
+                try:
+                    if sftp.stat(self.remote_path).st_size != self.file_size:
+                        sftp.truncate(self.remote_path, self.file_size)
+                except IOError:
+                    with sftp.open(self.remote_path, "wb"):
+                        pass
+                    sftp.truncate(self.remote_path, self.file_size)
+                    self.manifest["done"] = dict()
+        else:
+            if not os.path.exists(self.local_path):
+                self.manifest["done"] = dict()
+            with open(self.local_path, "ab") as destination:
+                destination.truncate(self.file_size)
+        pending = [(index, offset, length) for index, (offset, length) in enumerate(chunks)
+                   if str(index) not in self.manifest["done"]]
+        self.transferred = self.file_size - sum(length for _, _, length in pending)
+        self._run(pending)
+
+        retried = list()
+        indexes = list(range(len(chunks)))
+        compared = self._compare(indexes)
+        if compared["status"] != "success":
+            return compared
+        mismatched = [(index, *chunks[index]) for index in compared["mismatched"]]
+        if mismatched:
+            retried = [index for index, _, _ in mismatched]
+            for index in retried:
+                self.manifest["done"].pop(str(index), None)
+            self.transferred -= sum(length for _, _, length in mismatched)
+            self._run(mismatched)
+            # only the chunks sent again are read once more.
+            compared = self._compare(retried)
+            if compared["status"] != "success":
+                return compared
+        verified = not compared["mismatched"]
+        if verified and os.path.exists(self.manifest_file):
+            os.remove(self.manifest_file)
+        return {
+            "status": "success" if verified else "failed",
+            "bytes": self.file_size,
+            "chunks": len(chunks),
+            "transferred_chunks": len(pending),
+            "retried": retried,
+            "mismatched": compared["mismatched"],
+            "elapsed": time.monotonic() - start
+        }
+
+    def _compare(self, indexes: List[int]) -> Dict[str, Any]:
+        """
+        Compare the chunks of the remote file with the chunks of the local data.
+        :return:
+            dictionary of response, mismatched is the list of chunk indexes which differ.
+        """
+        remote = remote_chunk_hashes(self.ssh, self.remote_path, self.chunk_size, indexes)
+        if remote["status"] != "success":
+            return remote
+        if self.direction == "upload":
+            # hashed while the chunks were read from the local file.
+            local = self.manifest["done"]
+        else:
+            local = local_chunk_hashes(self.local_path, self.chunk_size, indexes)
+            # the manifest of a download records what was written, keep it in line with the local file.
+            self.manifest["done"].update(local)
+        return {
+            "status": "success",
+            "mismatched": [index for index in indexes if local.get(str(index)) != remote["chunks"][str(index)]]
+        }
@@ -0,0 +1,228 @@
+"""
+Deadline and cancellation of the calls on Ansible AWX, so one hung AWX worker cannot block a provisioning thread
+forever.
+
+A deadline covers everything done inside its with block by the same thread, including the lookups which a Tower
+method does by itself such as find_resource_id or collect_info, every request is sent with the remaining time as its
+connect and read timeouts. Another thread can cancel the deadline at any moment, the next request, poll or page does
+not start and DeadlineExceeded is raised instead. A request already sent is not interrupted, it is bounded by the
+remaining time.
+
+    with tower.deadline(30) as deadline:
+        tower.create_job_templates_cred(...)
+
+Deadlines nest, the inner deadline never outlives the outer one and cancelling the outer one cancels both.
+Only the standard library is imported here, DeadlineExceeded is caught by the cli before helper.awx_api is loaded.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, local
+from typing import Any, Callable, Dict, Optional, Tuple
+import functools
+import time
+
+# Connect timeout of every request sent under a deadline, a connection which is not made by then will not be made.
+CONNECT_TIMEOUT = 10.0
+
+# Number of completed requests kept in the progress of DeadlineExceeded, the oldest are dropped.
+PROGRESS_REQUESTS = 20
+
+_active = local()
+
+
+class DeadlineExceeded(Exception):
+    """
+    The deadline has run out or has been cancelled before the call was done.
+    progress tells how far the call went: elapsed seconds, budget, whether it was cancelled, what was being done,
+    the number of requests completed and the last of them.
+    partial is set by the methods which have something to give back, such as the pages collected by get_all_pages.
+    """
+    def __init__(self, message: str, progress: Dict[str, Any], partial: Any = None):
+        super().__init__(message)
+        self.progress = progress
+        self.partial = partial
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "status": "timeout",
+            "message": str(self),
+            "progress": self.progress
+        }
+        if self.partial is not None:
+            result.update({"partial": self.partial})
+        return result
+
+
+class Deadline:
+    """
+    Also a cancellation token, keep the object to cancel it from another thread.
+    """
+    def __init__(self, seconds: float = None, inherit: bool = True):
+        """
+        :param seconds:
+            overall budget of the with block, None only cancels.
+        :param inherit:
+            also bounded by the deadline active in this thread, False for clean up work which must be tried
+            even after the caller has run out of time.
+        """
+        self.seconds = seconds
+        self.parent = current() if inherit else None
+        self.started = time.monotonic()
+        self.expires = self.started + seconds if seconds is not None else None
+        self._cancelled = Event()
+        self._lock = Lock()
+        self.completed = 0
+        self.requests = list()
+
+    def __enter__(self) -> "Deadline":
+        stack = getattr(_active, "stack", None)
+        if stack is None:
+            stack = _active.stack = list()
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _active.stack.pop()
+
+    def cancel(self):
+        """
+        Safe to call from any thread, the threads waiting in sleep wake up at once.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self) -> Optional[float]:
+        """
+        :return:
+            seconds left, never below 0, None if neither this deadline nor its parents have a budget.
+        """
+        remaining = None if self.expires is None else max(0.0, self.expires - time.monotonic())
+        if self.parent is not None:
+            parent_remaining = self.parent.remaining()
+            if parent_remaining is not None:
+                remaining = parent_remaining if remaining is None else min(remaining, parent_remaining)
+        return remaining
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return self.cancelled or (remaining is not None and remaining <= 0)
+
+    def timeout(self, doing: str = None) -> Optional[Tuple[float, float]]:
+        """
+        The clock is read once, so the timeouts are never 0, which requests rejects with ValueError.
+        Raise DeadlineExceeded instead if there is no time left or it has been cancelled.
+        :return:
+            (connect, read) timeouts for requests, None if there is no budget.
+        """
+        remaining = self.remaining()
+        if self.cancelled or (remaining is not None and remaining <= 0):
+            raise self.exceeded(doing)
+        if remaining is None:
+            return None
+        return min(CONNECT_TIMEOUT, remaining), remaining
+
+    def record(self, method: str, url: str, status_code: int):
+        """
+        A request is done, kept for the progress of DeadlineExceeded, the parents see it too.
+        """
+        with self._lock:
+            self.completed += 1
+            self.requests.append(f"{method.upper()} {url} {status_code}")
+            del self.requests[:-PROGRESS_REQUESTS]
+        if self.parent is not None:
+            self.parent.record(method, url, status_code)
+
+    def progress(self, doing: str = None) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "elapsed": round(time.monotonic() - self.started, 3),
+                "seconds": self.seconds,
+                "cancelled": self.cancelled,
+                "doing": doing,
+                "completed": self.completed,
+                "requests": list(self.requests)
+            }
+
+    def exceeded(self, doing: str = None, partial: Any = None) -> DeadlineExceeded:
+        if self.cancelled:
+            reason = "was cancelled"
+        elif self.expires is not None and time.monotonic() >= self.expires:
+            reason = f"ran out of its {self.seconds} seconds"
+        else:
+            reason = "ran out of the time of its outer deadline"
+        message = f"The deadline {reason}" + (f" while doing {doing}." if doing else ".")
+        return DeadlineExceeded(message, self.progress(doing), partial)
+
+    def check(self, doing: str = None):
+        """
+        Raise DeadlineExceeded if there is no time left or it has been cancelled.
+        """
+        if self.expired():
+            raise self.exceeded(doing)
+
+    def sleep(self, seconds: float, doing: str = None):
+        """
+        time.sleep which wakes up on cancel and never sleeps past the deadline.
+        """
+        remaining = self.remaining()
+        self._wait(seconds if remaining is None else min(seconds, remaining))
+        self.check(doing)
+
+    def _wait(self, seconds: float):
+        # the parents can be cancelled too, they are looked at every 0.1 seconds.
+        end = time.monotonic() + seconds
+        while not self.cancelled:
+            left = end - time.monotonic()
+            if left <= 0:
+                return
+            if self._cancelled.wait(left if self.parent is None else min(left, 0.1)):
+                return
+
+
+def current() -> Optional[Deadline]:
+    """
+    The innermost deadline of this thread, None if there is none.
+    """
+    stack = getattr(_active, "stack", None)
+    return stack[-1] if stack else None
+
+
+def check(doing: str = None):
+    deadline = current()
+    if deadline is not None:
+        deadline.check(doing)
+
+
+def sleep(seconds: float, doing: str = None):
+    deadline = current()
+    if deadline is None:
+        time.sleep(seconds)
+    else:
+        deadline.sleep(seconds, doing)
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Carry the deadline of this thread to fn when it runs in another thread.
+    """
+    deadline = current()
+    if deadline is None:
+        return fn
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        with deadline:
+            return fn(*args, **kwargs)
+
+    return bound
+
+
+class DeadlineExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor whose workers run under the deadline of the thread which submitted the work.
+    """
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(bind(fn), *args, **kwargs)
+
@@ -0,0 +1,236 @@
+"""
+rsync like synchronisation of a local playbook directory to a manual project directory of Ansible AWX.
+The local manifest (path, size, mtime, sha256) is compared with the remote manifest which is collected with one
+remote command, only new or changed files are uploaded and the files which no longer exist locally are removed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+import os
+import shlex
+
+from paramiko import SFTPClient
+
+from helper.file_hash import hash_files, default_cache
+
+# Paths per remote command, the whole script is one argument of bash -c which Linux caps at 128 KiB.
+PATHS_PER_COMMAND = 500
+
+# Separates the size/mtime listing from the sha256 listing in the output of the remote command.
+MANIFEST_SEPARATOR = "--- sha256 ---"
+
+
+def local_manifest(root: str, use_cache: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Walk the local directory and describe every file.
+    :param root:
+        local directory.
+    :param use_cache:
+        take the sha256 of unchanged files from the persistent hash cache.
+    :return:
+        dictionary of relative path (with / as separator) to size, mtime and sha256.
+    """
+    file_paths = list()
+    for dirpath, _, filenames in os.walk(root):
+        file_paths.extend(os.path.join(dirpath, filename) for filename in filenames)
+    digests = hash_files(file_paths, cache=default_cache() if use_cache else None)
+    manifest = dict()
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        relative_path = os.path.relpath(file_path, root).replace(os.sep, "/")
+        manifest[relative_path] = {
+            "size": stat.st_size,
+            "mtime": int(stat.st_mtime),
+            "sha256": digests[file_path]
+        }
+    return manifest
+
+
+def remote_manifest(ssh, root: str, remote_hash: bool = True) -> Dict[str, Any]:
+    """
+    Describe every file of the remote directory with one remote command.
+    :param ssh:
+        LinuxSSH instance.
+    :param root:
+        absolute path of the remote directory.
+    :param remote_hash:
+        if False only size and mtime are collected, which is cheaper for the remote server.
+    :return:
+        dictionary with status and manifest, which has the same format as local_manifest.
+    """
+    path = shlex.quote(root)
+    command = f"[ -d {path} ] || exit 0; cd {path} && find . -type f -printf '%s\\t%T@\\t%P\\n'"
+    if remote_hash:
+        command += f" && echo '{MANIFEST_SEPARATOR}' && find . -type f -print0 | xargs -0 -r sha256sum"
+    response = ssh.run_batch([command])
+    if response["status"] != "success":
+        return {
+            "status": "failed",
+            "message": response.get("message", response.get("results"))
+        }
+    manifest = dict()
+    listing, _, digests = response["results"][0]["output"].partition(MANIFEST_SEPARATOR)
+    for row in listing.splitlines():
+        if row.count("\t") < 2:
+            continue
+        size, mtime, relative_path = row.split("\t", 2)
+        manifest[relative_path] = {
+            "size": int(size),
+            "mtime": int(float(mtime)),
+            "sha256": None
+        }
+    for row in digests.splitlines():
+        if not row.strip():
+            continue
+        digest, relative_path = row.split(None, 1)
+        # sha256sum prints ./path
+        relative_path = relative_path[2:] if relative_path.startswith("./") else relative_path
+        if relative_path in manifest:
+            manifest[relative_path]["sha256"] = digest
+    return {
+        "status": "success",
+        "manifest": manifest
+    }
+
+
+def diff_manifests(local: Dict[str, Dict[str, Any]], remote: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Compare the manifests, a file is changed if the sha256 differs, if the remote sha256 is not collected
+    the size and mtime are compared instead.
+    :return:
+        dictionary of upload, delete and unchanged lists of relative paths.
+    """
+    upload = list()
+    unchanged = list()
+    for relative_path, local_file in local.items():
+        remote_file = remote.get(relative_path)
+        if remote_file is None:
+            upload.append(relative_path)
+        elif remote_file.get("sha256") is not None:
+            (unchanged if remote_file["sha256"] == local_file["sha256"] else upload).append(relative_path)
+        elif remote_file["size"] == local_file["size"] and remote_file["mtime"] == local_file["mtime"]:
+            unchanged.append(relative_path)
+        else:
+            upload.append(relative_path)
+    return {
+        "upload": sorted(upload),
+        "delete": sorted(path for path in remote if path not in local),
+        "unchanged": sorted(unchanged)
+    }
+
+
+def upload_files(ssh, local_root: str, remote_root: str, relative_paths: List[str],
+                 local: Dict[str, Dict[str, Any]], telemetry=None):
+    """
+    Worker, upload the files over its own sftp channel and keep the local mtime on the remote file, so the next
+    sync can compare by size and mtime.
+    """
+    sftp = SFTPClient.from_transport(ssh.get_transport())
+    try:
+        for relative_path in relative_paths:
+            remote_path = f"{remote_root}/{relative_path}"
+            callback = telemetry.callback(relative_path, local[relative_path]["size"]) if telemetry else None
+            sftp.put(os.path.join(local_root, *relative_path.split("/")), remote_path, callback=callback)
+            mtime = local[relative_path]["mtime"]
+            sftp.utime(remote_path, (mtime, mtime))
+    finally:
+        sftp.close()
+
+
+def path_commands(prefix: str, paths: List[str]) -> List[str]:
+    """
+    One command per PATHS_PER_COMMAND paths, such as mkdir -p or rm -f of a large tree.
+    """
+    return [f"{prefix} {' '.join(shlex.quote(path) for path in paths[index:index + PATHS_PER_COMMAND])}"
+            for index in range(0, len(paths), PATHS_PER_COMMAND)]
+
+
+def run_path_commands(ssh, commands: List[str]) -> Dict[str, Any]:
+    """
+    Every command in its own run_batch, so no script goes over the argument size limit.
+    """
+    results = list()
+    for command in commands:
+        response = ssh.run_batch([command])
+        if response["status"] != "success":
+            return response
+        results.extend(response["results"])
+    return {
+        "status": "success",
+        "results": results
+    }
+
+
+def sync_dir(ssh, local_root: str, remote_root: str, delete: bool = True, workers: int = 4,
+             remote_hash: bool = True, dry_run: bool = False, telemetry=None,
+             local: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Synchronise the local directory to the remote directory.
+    :param ssh:
+        LinuxSSH instance.
+    :param local_root:
+        local directory.
+    :param remote_root:
+        absolute path of the remote directory.
+    :param delete:
+        remove remote files which do not exist in the local directory.
+    :param workers:
+        number of sftp channels uploading concurrently.
+    :param remote_hash:
+        compare by sha256, if False compare by size and mtime.
+    :param dry_run:
+        only report what would be uploaded and deleted.
+    :param telemetry:
+        TransferTelemetry which collects the progress of the uploads.
+    :param local:
+        local_manifest of local_root, a group of servers synchronised from the same directory walks and hashes it once.
+    :return:
+        dictionary of the upload, delete and unchanged files and the bytes uploaded.
+
+    The uploads run as the ssh user, which cannot write into a directory owned by awx. The directories which receive
+    files and the files which are replaced are given to the ssh user for the transfer, and the whole directory is
+    given back to awx afterwards, even if the transfer fails.
+    """
+    if local is None:
+        local = local_manifest(local_root)
+    remote = remote_manifest(ssh, remote_root, remote_hash=remote_hash)
+    if remote["status"] != "success":
+        return remote
+    diff = diff_manifests(local, remote["manifest"])
+    result = {
+        "status": "success",
+        "uploaded": diff["upload"],
+        "deleted": diff["delete"] if delete else [],
+        "unchanged": len(diff["unchanged"]),
+        "bytes": sum(local[path]["size"] for path in diff["upload"])
+    }
+    if dry_run:
+        return result
+    commands = list()
+    if diff["upload"]:
+        directories = sorted({f"{remote_root}/{path}".rsplit("/", 1)[0] for path in diff["upload"]})
+        replaced = [f"{remote_root}/{path}" for path in diff["upload"] if path in remote["manifest"]]
+        commands.extend(path_commands("mkdir -p", directories))
+        commands.extend(path_commands(f"chown {shlex.quote(ssh.username)}", directories + replaced))
+    if delete and diff["delete"]:
+        commands.extend(path_commands("rm -f", [f"{remote_root}/{path}" for path in diff["delete"]]))
+    if not commands:
+        return result
+    try:
+        response = run_path_commands(ssh, commands)
+        if response["status"] != "success":
+            return response
+        if diff["upload"]:
+            workers = max(1, min(workers, len(diff["upload"])))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(upload_files, ssh, local_root, remote_root,
+                                           diff["upload"][worker::workers], local, telemetry)
+                           for worker in range(workers)]
+                for future in futures:
+                    future.result()
+    finally:
+        # after the transfer, awx owns the project directory again whatever happened.
+        response = ssh.run_batch([f"chown -R awx:awx {shlex.quote(remote_root)}"])
+    if response["status"] != "success":
+        response.update({"uploaded": diff["upload"]})
+        return response
+    return result
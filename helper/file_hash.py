@@ -0,0 +1,142 @@
+"""
+sha256 of local files for upload verification and directory manifests.
+Large files are hashed through mmap, the other files are read with a large buffer, many files are hashed
+concurrently on a thread pool. hashlib releases the GIL while it hashes a large buffer, and no process is started,
+so it is safe in scripts which have no main guard. The digests are kept in a persistent cache keyed by
+(path, size, mtime, inode), a file which has not changed since it was last hashed is never read again.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import mmap
+import os
+import sqlite3
+
+# Files smaller than this are read with a buffer, larger files are memory mapped.
+MMAP_THRESHOLD = 67108864
+
+# Buffer size for reading files.
+HASH_BLOCK_SIZE = 4194304
+
+# Below this number of bytes to hash, the pool costs more than it saves.
+POOL_THRESHOLD = 33554432
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ansible_api", "hash_cache.sqlite3")
+
+
+def sha256_file(file_path: str) -> str:
+    """
+    sha256 of one file, nothing is written to the disk.
+    :param file_path:
+        path of the file.
+    :return:
+        hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            buffer = bytearray(HASH_BLOCK_SIZE)
+            view = memoryview(buffer)
+            read = file.readinto(buffer)
+            while read:
+                digest.update(view[:read])
+                read = file.readinto(buffer)
+    return digest.hexdigest()
+
+
+def file_key(file_path: str) -> Tuple[str, int, int, int]:
+    """
+    (absolute path, size, mtime in ns, inode), any change of the file changes the key.
+    """
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class HashCache:
+    """
+    Persistent cache of sha256 digests, sqlite keeps it safe when several processes use it at the same time.
+    """
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._lock = Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, "
+                                     "mtime_ns INTEGER, inode INTEGER, sha256 TEXT)")
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: Tuple[str, int, int, int]) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT size, mtime_ns, inode, sha256 FROM hashes WHERE path = ?",
+                                           (key[0],)).fetchone()
+            if row is not None and tuple(row[:3]) == key[1:]:
+                self.hits += 1
+                return row[3]
+            self.misses += 1
+            return None
+
+    def store(self, entries: List[Tuple[Tuple[str, int, int, int], str]]):
+        if not entries:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                                         [(*key, digest) for key, digest in entries])
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def hash_files(file_paths: List[str], cache: HashCache = None, workers: int = None) -> Dict[str, str]:
+    """
+    sha256 of many files, unchanged files come from the cache, the others are hashed concurrently.
+    :param file_paths:
+        list of file paths.
+    :param cache:
+        HashCache, if None every file is hashed.
+    :param workers:
+        number of threads, default is the number of cpus.
+    :return:
+        dictionary of file path to hex digest.
+    """
+    digests = dict()
+    misses = list()
+    for file_path in file_paths:
+        key = file_key(file_path)
+        digest = cache.lookup(key) if cache is not None else None
+        if digest is None:
+            misses.append((file_path, key))
+        else:
+            digests[file_path] = digest
+    if sum(key[1] for _, key in misses) < POOL_THRESHOLD or len(misses) < 2:
+        hashed = [sha256_file(file_path) for file_path, _ in misses]
+    else:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            hashed = list(executor.map(sha256_file, [file_path for file_path, _ in misses]))
+    for (file_path, _), digest in zip(misses, hashed):
+        digests[file_path] = digest
+    if cache is not None:
+        cache.store([(key, digest) for (_, key), digest in zip(misses, hashed)])
+    return digests
+
+
+_default_cache = None
+_default_cache_lock = Lock()
+
+
+def default_cache() -> HashCache:
+    """
+    The cache shared by the helpers of this package, opened once per process.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HashCache()
+        return _default_cache
@@ -1,18 +1,34 @@
 from paramiko import SSHClient, AutoAddPolicy
 from paramiko.ssh_exception import SSHException
 from paramiko.util import log_to_file
-from typing import Dict, Union, List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Union, List, Tuple
 from pathlib import Path
+from uuid import uuid4
+import hmac
 import os
+import posixpath
+import shlex
+import tarfile
+import time
 from types import MappingProxyType
 import sys
 
 # The progress bar for download and upload files.
-from helper.progress_bar import progress_bar
+from helper.progress_bar import TransferTelemetry
+from helper.chunked_transfer import ChunkedTransfer, CHUNK_SIZE
+from helper.dir_sync import sync_dir, local_manifest
+from helper.file_hash import hash_files, default_cache
+from helper import tar_stream
 
 # Consolidate Errors
 CONN_EXCEPTION = SSHException, TypeError, PermissionError
 
+# Block size used when the file is read, hashed and written to the remote file in one pass.
+TRANSFER_BLOCK_SIZE = 1048576
+
 # Home directory for OS, works on Linux and Windows, not sure about others.
 HOME_PATH = str(Path.home())
 
@@ -32,8 +48,8 @@ LOG_LEVEL = MappingProxyType(
 def get_file_hash(base_path: str = None, filename: str = None):
     """
     https://nitratine.net/blog/post/how-to-hash-files-in-python/
-    The concept, read the target file block by block, each block size is 65535 bytes.
-    On each block calculate the hash until the EOF.
+    The concept, read the target file block by block and calculate the hash until the EOF, see helper/file_hash.py.
+    The digest is kept in a persistent cache, an unchanged file is not hashed again.
     Then write the entire digest back to a file.
     I have tested between 8KB of python script file and 600MB of centos iso file and both results are good, also
     on centos i have use the sha256sum to calculate the digests which are the same with the hash files uploaded.
@@ -44,20 +60,10 @@ def get_file_hash(base_path: str = None, filename: str = None):
     :return:
     """
     file_path = os.path.join(base_path, filename)
-
-    # normally loaded at first, but i prefer the library to be loaded if in use.
-    import hashlib
-
-    BLOCK_SIZE = 65535
-    digest = hashlib.sha256()
-    with open(file_path, "rb") as file:
-        # read the first 65535 bytes from the file.
-        file_blocks = file.read(BLOCK_SIZE)
-        while len(file_blocks) > 0:
-            digest.update(file_blocks)
-            file_blocks = file.read(BLOCK_SIZE)
+    # The digest of an unchanged file comes from the persistent hash cache, the file is not read again.
+    digest = hash_files([file_path], cache=default_cache())[file_path]
     with open(os.path.join(base_path, f"{filename}.sha256"), "w") as write_hash:
-        write_hash.write(digest.hexdigest())
+        write_hash.write(digest)
     return f"{filename}.sha256"
 
 
@@ -71,7 +77,20 @@ class LinuxSSH(SSHClient):
                  hostname: str = "127.0.0.1",
                  port: int = 22,
                  log_file: str = None,
-                 level: int = None):
+                 level: int = None,
+                 lazy: bool = False,
+                 keepalive: int = 0,
+                 telemetry: TransferTelemetry = None):
+        """
+        :param lazy:
+            if True the ssh session is not attempted here, call ensure_connected before use.
+        :param keepalive:
+            seconds between transport keepalive packets, 0 disables keepalive.
+        :param telemetry:
+            TransferTelemetry shared by all transfers of this session, e.g. a headless one for services, it starts
+            reporting with the first transfer and the caller closes it.
+            If None each transfer method draws its own throttled progress bar.
+        """
         super().__init__()
         if log_file is not None and level is not None:
             log_to_file(log_file, level=level)
@@ -79,42 +98,254 @@ class LinuxSSH(SSHClient):
         self.password = password
         self.hostname = hostname
         self.port = port
+        self.keepalive = keepalive
+        self.telemetry = telemetry
+        # Cached listings of list_dir, keyed by directory.
+        self._dir_cache = dict()
+        self._dir_cache_lock = Lock()
         self._policy = AutoAddPolicy()  # modify the original default RejectPolicy()
+        if lazy:
+            return
         # Once an instance is created, a ssh session is attempted.
         try:
             self.connect(self.hostname, port=self.port, username=self.username, password=self.password)
+            if self.keepalive > 0:
+                self.get_transport().set_keepalive(self.keepalive)
         except CONN_EXCEPTION as CE:
             sys.stdout.write(f"Message: {str(CE)}")
             sys.exit(1)
 
-    def get_project_dirs(self, dirname: str = "/var/lib/awx/projects") -> Union[Dict[str, str], Dict[str, List]]:
+    @contextmanager
+    def transfer_telemetry(self, telemetry: TransferTelemetry = None):
         """
-        To get a list of directories under the Ansible AWX base project directory.
-        :param dirname:
-            Project base directory. Ansible searches the yaml file from base directory.
-        :return:
-            dictionary of response.
+        The telemetry given by the caller, such as LinuxSSHGroup, or the shared telemetry if there is one,
+        otherwise a telemetry for the duration of one transfer method.
         """
+        telemetry = telemetry if telemetry is not None else self.telemetry
+        if telemetry is not None:
+            yield telemetry
+            return
+        with TransferTelemetry() as telemetry:
+            yield telemetry
+
+    def is_healthy(self) -> bool:
+        """
+        Check the transport is still usable, an ignore packet is sent so a dead socket is found before use.
+        """
+        transport = self.get_transport()
+        if transport is None or not transport.is_active():
+            return False
         try:
-            # exec_command throws up a tuple(stdin, stdout, stderr)
-            stdin, stdout, _ = self.exec_command(f"sudo ls -lah {dirname}", get_pty=True)
-            stdin.write(self.password + "\n")
-            stdin.flush()
-            stdout_results = stdout.read().decode("utf-8")
-            pbdirs = list()
-            for row in stdout_results.splitlines()[3:]:  # Not interested in password, sudo prompt and total 0
-                # if "d" is found in the row
-                if "d" in row.split()[0]:
-                    pbdirs.append(row.split()[-1])  # the directory name is in the last index of the row.
+            transport.send_ignore()
+            return True
+        except (SSHException, EOFError, OSError):
+            return False
+
+    def ensure_connected(self) -> Dict[str, str]:
+        """
+        Connect if there is no session yet, or reconnect if the session is stale.
+        Unlike the constructor this method never exits, it returns the status instead.
+        :return:
+            dictionary of response, connected is True if a new session was made.
+        """
+        if self.is_healthy():
             return {
                 "status": "success",
-                "playbook_dirs": pbdirs[2:] if len(pbdirs) > 2 else []  # not interested in . and ..
+                "connected": False
             }
+        self.close()
+        try:
+            self.connect(self.hostname, port=self.port, username=self.username, password=self.password)
+            if self.keepalive > 0:
+                self.get_transport().set_keepalive(self.keepalive)
+        except (*CONN_EXCEPTION, OSError, EOFError) as CE:
+            return {
+                "status": "failed",
+                "message": str(CE)
+            }
+        return {
+            "status": "success",
+            "connected": True
+        }
+
+    def run_batch(self, commands: List[str] = None, sudo: bool = True,
+                  stop_on_error: bool = False) -> Union[Dict[str, str], Dict[str, List]]:
+        """
+        Run a batch of commands as one script over a single channel, the sudo password is sent only once.
+        Each command is wrapped with markers so that the output and exit status of every command can be separated
+        from the combined stdout.
+        :param commands:
+            list of shell commands, do not prefix them with sudo, the whole script runs with sudo if sudo is True.
+        :param sudo:
+            run the script as root.
+        :param stop_on_error:
+            stop the script at the first command which exits with non zero.
+        :return:
+            dictionary of response, results is a list of command, exit_status and output in the order of commands.
+
+        The script runs without a pty so that stdout is not mixed with the echo of the password, a host whose
+        sudoers has requiretty refuses that, the script is then run once more with a pty.
+        """
+        if not commands:
+            return {
+                "status": "failed",
+                "message": "No commands to run."
+            }
+        # A random marker which cannot be mistaken as the output of the commands.
+        marker = uuid4().hex
+        lines = list()
+        for index, command in enumerate(commands):
+            lines.append(f"printf '\\n{marker} begin {index}\\n'")
+            # stdin is not used by the commands, the sudo password is the only thing written to stdin.
+            lines.append(f"( {command} ) < /dev/null 2>&1")
+            lines.append(f"rc=$?; printf '\\n{marker} end {index} %d\\n' $rc")
+            if stop_on_error:
+                lines.append("[ $rc -eq 0 ] || exit $rc")
+        script = "\n".join(lines)
+        if sudo:
+            command = f"sudo -S -p '' bash -c {shlex.quote(script)}"
+        else:
+            command = f"bash -c {shlex.quote(script)}"
+        try:
+            stdout_results, stderr_results, script_status = self._exec_script(command, sudo, get_pty=False)
+            if sudo and script_status != 0 and "tty" in stderr_results and marker not in stdout_results:
+                # sudo: sorry, you must have a tty to run sudo
+                stdout_results, stderr_results, script_status = self._exec_script(command, sudo, get_pty=True)
         except CONN_EXCEPTION as CE:
             return {
                 "status": "failed",
                 "message": str(CE)
             }
+        results = list()
+        output = None
+        for row in stdout_results.splitlines():
+            if row.startswith(f"{marker} begin "):
+                output = list()
+            elif row.startswith(f"{marker} end "):
+                index, exit_status = row.split()[2:4]
+                results.append(
+                    {
+                        "command": commands[int(index)],
+                        "exit_status": int(exit_status),
+                        # Drop the blank line printed in front of the end marker.
+                        "output": "\n".join(output[:-1] if output and output[-1] == "" else output)
+                    }
+                )
+                output = None
+            elif output is not None:
+                output.append(row)
+        if not results and script_status != 0:
+            # The script did not start, most likely sudo refused the password.
+            return {
+                "status": "failed",
+                "message": stderr_results.strip() or stdout_results.strip()
+            }
+        return {
+            "status": "success" if all(result["exit_status"] == 0 for result in results) and
+            len(results) == len(commands) else "failed",
+            "results": results
+        }
+
+    def _exec_script(self, command: str, sudo: bool, get_pty: bool) -> Tuple[str, str, int]:
+        """
+        Run the script of run_batch, with a pty the output of the script and the echoed password are both in stdout,
+        the markers of run_batch tell them apart.
+        :return:
+            stdout, stderr and exit status of the script.
+        """
+        stdin, stdout, stderr = self.exec_command(command, get_pty=get_pty)
+        if sudo:
+            stdin.write(self.password + "\n")
+            stdin.flush()
+        stdout_results = stdout.read().decode("utf-8", errors="replace")
+        stderr_results = stderr.read().decode("utf-8", errors="replace")
+        return stdout_results, stderr_results, stdout.channel.recv_exit_status()
+
+    def list_dir(self, dirname: str = "/var/lib/awx/projects",
+                 refresh: bool = False) -> Union[Dict[str, str], Dict[str, Dict]]:
+        """
+        Structured listing of a directory, name, type, size, mtime and owner of every entry are collected with one
+        machine readable remote command. The listing is cached per directory, the create and remove methods of
+        this class update the cache themselves, so a batch of directory operations lists the directory once.
+        :param dirname:
+            absolute path of the directory.
+        :param refresh:
+            ignore the cache and list the directory again.
+        :return:
+            dictionary of response, entries is a dictionary of name to type (d, f, l...), size, mtime and owner.
+        """
+        with self._dir_cache_lock:
+            if not refresh and dirname in self._dir_cache:
+                return {
+                    "status": "success",
+                    "entries": dict(self._dir_cache[dirname])
+                }
+        response = self.run_batch([f"find {shlex.quote(dirname)} -mindepth 1 -maxdepth 1 "
+                                   f"-printf '%f\\t%y\\t%s\\t%T@\\t%u\\n'"])
+        if response["status"] != "success":
+            return {
+                "status": "failed",
+                "message": response.get("message", response.get("results"))
+            }
+        entries = dict()
+        for row in response["results"][0]["output"].splitlines():
+            if row.count("\t") < 4:
+                continue
+            name, entry_type, size, mtime, owner = row.rsplit("\t", 4)
+            entries[name] = {
+                "type": entry_type,
+                "size": int(size),
+                "mtime": float(mtime),
+                "owner": owner
+            }
+        with self._dir_cache_lock:
+            self._dir_cache[dirname] = entries
+        return {
+            "status": "success",
+            "entries": dict(entries)
+        }
+
+    def _cache_add_dirs(self, base_path: str, dirnames: List[str]):
+        """
+        Record directories created by this class in the cached listing of base_path.
+        """
+        with self._dir_cache_lock:
+            if base_path in self._dir_cache:
+                for dirname in dirnames:
+                    self._dir_cache[base_path][dirname] = {
+                        "type": "d",
+                        "size": 0,
+                        "mtime": time.time(),
+                        "owner": "awx"
+                    }
+
+    def _cache_remove_dirs(self, base_path: str, dirnames: List[str]):
+        """
+        Forget directories removed by this class from the cached listing of base_path.
+        """
+        with self._dir_cache_lock:
+            if base_path in self._dir_cache:
+                for dirname in dirnames:
+                    self._dir_cache[base_path].pop(dirname, None)
+
+    def get_project_dirs(self, dirname: str = "/var/lib/awx/projects",
+                         refresh: bool = False) -> Union[Dict[str, str], Dict[str, List]]:
+        """
+        To get a list of directories under the Ansible AWX base project directory.
+        :param dirname:
+            Project base directory. Ansible searches the yaml file from base directory.
+        :param refresh:
+            ignore the cached listing, see list_dir.
+        :return:
+            dictionary of response.
+        """
+        response = self.list_dir(dirname=dirname, refresh=refresh)
+        if response["status"] != "success":
+            return response
+        return {
+            "status": "success",
+            "playbook_dirs": sorted(name for name, entry in response["entries"].items() if entry["type"] == "d")
+        }
 
     def create_project_dir(self, base_path: str = "/var/lib/awx/projects", dirname: str = None):
         """
@@ -132,21 +363,12 @@ class LinuxSSH(SSHClient):
         else:
             return response
         if dirname not in pbdirs or pbdirs == list():
-            # create the directory if not exists.
-            commands = [f"sudo mkdir {base_path}/{dirname}",
-                        f"sudo chown -R awx:awx {base_path}/{dirname}"]
-            try:
-                for command in commands:
-                    stdin, stdout, _ = self.exec_command(command, get_pty=True)
-                    # sudo password
-                    stdin.write(self.password + "\n")
-                    stdin.flush()
-                    stdout.read().decode("utf-8")
-            except CONN_EXCEPTION as CE:
-                return {
-                    "status": "failed",
-                    "message": str(CE)
-                }
+            # create the directory if not exists, mkdir and chown share one channel.
+            path = shlex.quote(posixpath.join(base_path, dirname))
+            response = self.run_batch([f"mkdir {path}", f"chown -R awx:awx {path}"], stop_on_error=True)
+            if response["status"] == "success":
+                self._cache_add_dirs(base_path, [dirname])
+            return response
         else:
             return {
                 "status": "failed",
@@ -176,23 +398,82 @@ class LinuxSSH(SSHClient):
             return response
         if dirname in pbdirs:
             # if the requested directory for removal exists, prepare the rm command.
-            command = f"sudo rm -rf {base_path}/{dirname}"
-            try:
-                stdin, stdout, stderr = self.exec_command(command, get_pty=True)
-                # sudo password
-                stdin.write(self.password + "\n")
-                stdin.flush()
-            except CONN_EXCEPTION as CE:
-                return {
-                    "status": "failed",
-                    "message": str(CE)
-                }
+            response = self.run_batch([f"rm -rf {shlex.quote(posixpath.join(base_path, dirname))}"])
+            if response["status"] == "success":
+                self._cache_remove_dirs(base_path, [dirname])
+            return response
         else:
             return {
                 "status": "failed",
                 "message": f"{dirname} does not exists."
             }
 
+    def create_project_dirs(self, base_path: str = "/var/lib/awx/projects", dirnames: List[str] = None):
+        """
+        Create many project directories with one listing and one channel.
+        :param base_path:
+            Project base path
+        :param dirnames:
+            list of new project directories.
+        :return:
+            dictionary of response, results has the output and exit status of every command.
+        """
+        if not dirnames:
+            return {
+                "status": "failed",
+                "message": "You have forgotten to provide the project dir names you want to create."
+            }
+        response = self.get_project_dirs(dirname=base_path)
+        if response["status"] != "success":
+            return response
+        exists = [dirname for dirname in dirnames if dirname in response["playbook_dirs"]]
+        if exists:
+            return {
+                "status": "failed",
+                "message": f"{', '.join(exists)} exists."
+            }
+        commands = list()
+        for dirname in dirnames:
+            path = shlex.quote(posixpath.join(base_path, dirname))
+            commands.extend([f"mkdir {path}", f"chown -R awx:awx {path}"])
+        response = self.run_batch(commands)
+        # Only the directories which mkdir succeeded are recorded, mkdir is the first of the two commands of each.
+        results = response.get("results", [])
+        created = [dirname for dirname, result in zip(dirnames, results[::2]) if result["exit_status"] == 0]
+        self._cache_add_dirs(base_path, created)
+        return response
+
+    def remove_project_dirs(self, base_path: str = "/var/lib/awx/projects", dirnames: List[str] = None):
+        """
+        Remove many project directories with one listing and one channel.
+        :param base_path:
+            Project base path.
+        :param dirnames:
+            list of directory names under the base path.
+        :return:
+            dictionary of response, results has the output and exit status of every command.
+        """
+        if not dirnames:
+            return {
+                "status": "failed",
+                "message": "You have forgotten to provide the project dir names you want to remove."
+            }
+        response = self.get_project_dirs(dirname=base_path)
+        if response["status"] != "success":
+            return response
+        missing = [dirname for dirname in dirnames if dirname not in response["playbook_dirs"]]
+        if missing:
+            return {
+                "status": "failed",
+                "message": f"{', '.join(missing)} does not exists."
+            }
+        response = self.run_batch([f"rm -rf {shlex.quote(posixpath.join(base_path, dirname))}" for dirname in dirnames])
+        # one command per directory, in the order of dirnames.
+        removed = [dirname for dirname, result in zip(dirnames, response.get("results", []))
+                   if result["exit_status"] == 0]
+        self._cache_remove_dirs(base_path, removed)
+        return response
+
     def download(self, src_abs_path: str = None,
                  dst_path: str = HOME_PATH,
                  dst_filename: str = None):
@@ -217,23 +498,62 @@ class LinuxSSH(SSHClient):
             The sftp open and close session is handled here, so user does not need to close the sftp session.
             The purpose is to have a more straightforward way to download/upload files to target server.
             """
-            # B is byte, b is bit. Miniters will have a better looking bar.
-            # ascii=True will give # as the bar.
-            callback, pbar = progress_bar(unit="B", unit_scale=True, miniters=1)
-            try:
-                sftp.get(src_abs_path, local_path, callback=callback)
-            except CONN_EXCEPTION as CE:
-                return {
-                    "status": "failed",
-                    "message": str(CE)
-                }
+            # The callback only records the bytes, the telemetry draws the bar at a throttled rate.
+            with self.transfer_telemetry() as telemetry:
+                try:
+                    sftp.get(src_abs_path, local_path, callback=telemetry.callback(src_abs_path))
+                except CONN_EXCEPTION as CE:
+                    return {
+                        "status": "failed",
+                        "message": str(CE)
+                    }
+
+    @staticmethod
+    def put_with_hash(sftp, local_path: str = None, remote_path: str = None, callback=None):
+        """
+        Upload a file and calculate its sha256 on the same bytes as they are written to the remote file, so the
+        local file is read only once.
+        :param sftp:
+            SFTPClient created by open_sftp().
+        :param local_path:
+            path of the local file.
+        :param remote_path:
+            absolute path of the remote file.
+        :param callback:
+            func(int, int) same as the callback of sftp.put.
+        :return:
+            tuple of the hex digest and the number of bytes transferred.
+        """
+        # normally loaded at first, but i prefer the library to be loaded if in use.
+        import hashlib
+
+        digest = hashlib.sha256()
+        file_size = os.stat(local_path).st_size
+        transferred = 0
+        with open(local_path, "rb") as local_file, sftp.open(remote_path, "wb") as remote_file:
+            # Do not wait for the server to acknowledge every write.
+            remote_file.set_pipelined(True)
+            file_blocks = local_file.read(TRANSFER_BLOCK_SIZE)
+            while len(file_blocks) > 0:
+                digest.update(file_blocks)
+                remote_file.write(file_blocks)
+                transferred += len(file_blocks)
+                if callback is not None:
+                    callback(transferred, file_size)
+                file_blocks = local_file.read(TRANSFER_BLOCK_SIZE)
+        return digest.hexdigest(), transferred
 
     def upload(self, src_path: str = HOME_PATH,
                src_filename: str = None,
                dst_filename: str = None,
-               dst_path: str = None):
+               dst_path: str = None,
+               stream_hash: bool = False):
         """
         This method uploads the file from your computer to remote server.
+        :param stream_hash:
+            If True the sha256 is calculated while the file is uploaded and compared with sha256sum of the remote
+            file, no .sha256 file is written to src_path nor uploaded.
+            If False the .sha256 file is written next to the source file and uploaded with it.
         :param dst_filename:
         :param dst_home_path:
         :param src_filename:
@@ -250,25 +570,488 @@ class LinuxSSH(SSHClient):
         else:
             local_path = src_path
         remote_path = f"{dst_path}/{dst_filename}"
+        if stream_hash:
+            return self._upload_stream_hash(local_path, remote_path, dst_path)
         digest_filename = get_file_hash(base_path=src_path, filename=src_filename)
-        digest_abs_path = os.path.join(src_path, digest_filename)
+        return self._upload_with_digest(local_path, remote_path, dst_path, os.path.join(src_path, digest_filename),
+                                        f"{dst_path}/{digest_filename}")
+
+    def _upload_with_digest(self, local_path: str, remote_path: str, dst_path: str, digest_abs_path: str,
+                            remote_digest_path: str, telemetry: TransferTelemetry = None):
+        """
+        Upload the file and its .sha256 file, which is already written by get_file_hash.
+        """
         with self.open_sftp() as sftp:
             """
             The sftp open and close session is handled here, so user does not need to close the sftp session.
             The purpose is to have a more straightforward way to download/upload files to target server.
             """
-            # b is bit, B is byte. If ascii=True, # will be used for progress bar.
-            callback, pbar = progress_bar(unit="B", unit_scale=True, miniters=1)
+            # Each file has its own callback, so the totals of the file and its digest are not mixed up.
+            with self.transfer_telemetry(telemetry) as telemetry:
+                try:
+                    sftp.chdir(dst_path)
+                    sftp.put(local_path, remote_path, callback=telemetry.callback(local_path))
+                    # The session to remote_path is still on, hence only target filename is required.
+                    sftp.put(digest_abs_path, remote_digest_path, callback=telemetry.callback(digest_abs_path))
+                    stdin, _, _ = self.exec_command(f"sudo chown -R awx:awx {dst_path}")
+                    stdin.write(f"{self.password}\n")
+                    stdin.flush()
+                except CONN_EXCEPTION as CE:
+                    return {
+                            "status": "failed",
+                            "message": str(CE)
+                        }
+
+    def _upload_stream_hash(self, local_path: str, remote_path: str, dst_path: str,
+                            telemetry: TransferTelemetry = None):
+        """
+        The stream_hash mode of upload, the remote checksum and the chown share one channel.
+        """
+        with self.open_sftp() as sftp, self.transfer_telemetry(telemetry) as telemetry:
             try:
-                sftp.chdir(dst_path)
-                sftp.put(local_path, remote_path, callback=callback)
-                # The session to remote_path is still on, hence only target filename is required.
-                sftp.put(digest_abs_path, f"{dst_path}/{digest_filename}", callback=callback)
-                stdin, _, _ = self.exec_command(f"sudo chown -R awx:awx {dst_path}")
-                stdin.write(f"{self.password}\n")
-                stdin.flush()
-            except CONN_EXCEPTION as CE:
+                digest, transferred = self.put_with_hash(sftp, local_path, remote_path,
+                                                         callback=telemetry.callback(local_path))
+            except (*CONN_EXCEPTION, OSError) as CE:
                 return {
-                        "status": "failed",
-                        "message": str(CE)
-                    }
+                    "status": "failed",
+                    "message": str(CE)
+                }
+        response = self.run_batch([f"sha256sum {shlex.quote(remote_path)}",
+                                   f"chown -R awx:awx {shlex.quote(dst_path)}"])
+        if not response.get("results"):
+            return response
+        remote_digest = response["results"][0]["output"].split()[0] if response["results"][0]["output"] else ""
+        return {
+            "status": "success" if response["status"] == "success" and remote_digest == digest else "failed",
+            "bytes": transferred,
+            "sha256": digest,
+            "remote_sha256": remote_digest
+        }
+
+    def parallel_upload(self, src_abs_path: str = None, dst_abs_path: str = None, chunk_size: int = CHUNK_SIZE,
+                        channels: int = 4, resume: bool = True):
+        """
+        Upload a large file in chunks over several sftp channels concurrently. If the upload is disconnected,
+        calling this method again with the same paths only uploads the chunks which are not yet done.
+        :param src_abs_path:
+            Absolute path of the local file.
+        :param dst_abs_path:
+            Absolute path of the remote file.
+        :param chunk_size:
+            size of each chunk in bytes.
+        :param channels:
+            number of sftp channels used concurrently.
+        :param resume:
+            if False the chunks of a previous transfer are ignored.
+        :return:
+            dictionary of response, mismatched lists the chunks which still differ after one retry.
+        """
+        return self._chunked_transfer("upload", src_abs_path, dst_abs_path, chunk_size, channels, resume)
+
+    def parallel_download(self, src_abs_path: str = None, dst_abs_path: str = None, chunk_size: int = CHUNK_SIZE,
+                          channels: int = 4, resume: bool = True):
+        """
+        Download a large file in chunks over several sftp channels concurrently. If the download is disconnected,
+        calling this method again with the same paths only downloads the chunks which are not yet done.
+        :param src_abs_path:
+            Absolute path of the remote file.
+        :param dst_abs_path:
+            Absolute path of the local file.
+        :param chunk_size:
+            size of each chunk in bytes.
+        :param channels:
+            number of sftp channels used concurrently.
+        :param resume:
+            if False the chunks of a previous transfer are ignored.
+        :return:
+            dictionary of response, mismatched lists the chunks which still differ after one retry.
+        """
+        return self._chunked_transfer("download", dst_abs_path, src_abs_path, chunk_size, channels, resume)
+
+    def _chunked_transfer(self, direction: str, local_path: str, remote_path: str, chunk_size: int,
+                          channels: int, resume: bool):
+        with self.transfer_telemetry() as telemetry:
+            transfer = ChunkedTransfer(self, direction, local_path, remote_path, chunk_size=chunk_size,
+                                       channels=channels, resume=resume,
+                                       callback=telemetry.callback(local_path if direction == "upload"
+                                                                   else remote_path))
+            try:
+                return transfer.start()
+            except (*CONN_EXCEPTION, OSError, EOFError) as CE:
+                return {
+                    "status": "failed",
+                    "message": f"{str(CE)}, call again to resume the transfer."
+                }
+
+    def sync_project_dir(self, src_path: str = None, dirname: str = None,
+                         base_path: str = "/var/lib/awx/projects", delete: bool = True, workers: int = 4,
+                         remote_hash: bool = True, dry_run: bool = False, local: Dict = None):
+        """
+        Synchronise a local playbook directory to a manual project directory, only new or changed files are
+        uploaded and files which no longer exist locally are removed.
+        :param src_path:
+            local playbook directory.
+        :param dirname:
+            project directory under the base path, it is created if it does not exist.
+        :param base_path:
+            Project base path.
+        :param delete:
+            remove remote files which do not exist in src_path.
+        :param workers:
+            number of sftp channels uploading concurrently.
+        :param remote_hash:
+            compare files by sha256, if False compare by size and mtime which is cheaper for the remote server.
+        :param dry_run:
+            only report what would be uploaded and deleted.
+        :param local:
+            local_manifest of src_path, collected here if None.
+        :return:
+            dictionary of response with the uploaded and deleted files.
+        """
+        if src_path is None or dirname is None:
+            return {
+                "status": "failed",
+                "message": "Both src_path and dirname are required."
+            }
+        try:
+            with self.transfer_telemetry() as telemetry:
+                response = sync_dir(self, src_path, f"{base_path}/{dirname}", delete=delete, workers=workers,
+                                    remote_hash=remote_hash, dry_run=dry_run, telemetry=telemetry, local=local)
+        except (*CONN_EXCEPTION, OSError) as CE:
+            return {
+                "status": "failed",
+                "message": str(CE)
+            }
+        if response["status"] == "success" and not dry_run:
+            # the project directory is created by mkdir -p if it did not exist.
+            self._cache_add_dirs(base_path, [dirname])
+        return response
+
+    def upload_tree(self, src_path: str = None, dirname: str = None,
+                    base_path: str = "/var/lib/awx/projects", compress: bool = True):
+        """
+        Upload a whole directory as one compressed tar stream over one channel, the files are extracted as awx:awx
+        into the project directory. Much faster than sftp for a playbook repository of many small files.
+        :param src_path:
+            local playbook directory.
+        :param dirname:
+            project directory under the base path, it is created if it does not exist.
+        :param base_path:
+            Project base path.
+        :param compress:
+            gzip the stream.
+        :return:
+            dictionary of response with files, bytes, bytes_per_sec and files_per_sec.
+        """
+        if src_path is None or dirname is None:
+            return {
+                "status": "failed",
+                "message": "Both src_path and dirname are required."
+            }
+        try:
+            response = tar_stream.upload_tree(self, src_path, f"{base_path}/{dirname}", compress=compress)
+        except (*CONN_EXCEPTION, OSError, EOFError) as CE:
+            return {
+                "status": "failed",
+                "message": str(CE)
+            }
+        if response["status"] == "success":
+            # the project directory is created by mkdir -p if it did not exist.
+            self._cache_add_dirs(base_path, [dirname])
+        return response
+
+    def download_tree(self, dirname: str = None, dst_path: str = HOME_PATH,
+                      base_path: str = "/var/lib/awx/projects", compress: bool = True):
+        """
+        Pull a whole project directory back as one compressed tar stream over one channel.
+        :param dirname:
+            project directory under the base path.
+        :param dst_path:
+            local directory where the files are extracted.
+        :param base_path:
+            Project base path.
+        :param compress:
+            gzip the stream.
+        :return:
+            dictionary of response with files, bytes, bytes_per_sec and files_per_sec, symlinks recreated and the
+            entries skipped, see tar_stream.download_tree.
+        """
+        if dirname is None:
+            return {
+                "status": "failed",
+                "message": "dirname is required."
+            }
+        try:
+            return tar_stream.download_tree(self, f"{base_path}/{dirname}", dst_path, compress=compress)
+        except (*CONN_EXCEPTION, OSError, EOFError, tarfile.TarError) as CE:
+            return {
+                "status": "failed",
+                "message": str(CE)
+            }
+
+
+class LinuxSSHGroup:
+    """
+    Connections to every node of a clustered Ansible AWX, each node needs the same manual project directory.
+    The methods of LinuxSSH are run on all nodes concurrently, so the time taken is the time of the slowest node.
+    """
+    def __init__(self, hostnames: List[str] = None,
+                 username: str = None,
+                 password: str = None,
+                 port: int = 22,
+                 max_workers: int = None,
+                 log_file: str = None,
+                 level: int = None,
+                 pool: "SSHPool" = None):
+        """
+        :param pool:
+            if a SSHPool is given the nodes are borrowed from the pool, so the sessions are reused
+            across groups and are not closed by close().
+        """
+        self.hostnames = list(hostnames) if hostnames else list()
+        self.pool = pool
+        self.max_workers = max_workers or max(1, len(self.hostnames))
+        self.nodes = dict()
+        self.failed_nodes = dict()
+        config = dict(username=username, password=password, port=port, log_file=log_file, level=level)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {hostname: executor.submit(self._connect, hostname, config, pool) for hostname in self.hostnames}
+            for hostname, future in futures.items():
+                node = future.result()
+                if isinstance(node, LinuxSSH):
+                    self.nodes[hostname] = node
+                else:
+                    self.failed_nodes[hostname] = node
+
+    @staticmethod
+    def _connect(hostname: str, config: Dict, pool: "SSHPool" = None) -> Union[LinuxSSH, str]:
+        if pool is not None:
+            node = pool.get(hostname=hostname, username=config["username"], password=config["password"],
+                            port=config["port"])
+            return node if isinstance(node, LinuxSSH) else node["message"]
+        # the constructor of LinuxSSH exits or raises if the connection fails, ensure_connected returns the status
+        # instead, so one bad node does not stop the others.
+        node = LinuxSSH(hostname=hostname, lazy=True, **config)
+        response = node.ensure_connected()
+        if response["status"] != "success":
+            node.close()
+            return f"Cannot connect to {hostname}: {response['message']}"
+        return node
+
+    def run(self, method: str = None, **kwargs) -> Dict[str, Union[str, Dict]]:
+        """
+        Run a method of LinuxSSH on every connected node concurrently.
+        :param method:
+            name of the LinuxSSH method, e.g. create_project_dir, upload, sync_project_dir.
+        :param kwargs:
+            arguments of the method, the same arguments are used on every node.
+        :return:
+            dictionary of response, nodes has the result and elapsed seconds of every node.
+        """
+        start = time.monotonic()
+
+        def timed(node: LinuxSSH):
+            node_start = time.monotonic()
+            try:
+                result = getattr(node, method)(**kwargs)
+            except (*CONN_EXCEPTION, OSError, EOFError) as CE:
+                result = {
+                    "status": "failed",
+                    "message": str(CE)
+                }
+            return {
+                "result": result,
+                "elapsed": time.monotonic() - node_start
+            }
+
+        nodes = dict()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {hostname: executor.submit(timed, node) for hostname, node in self.nodes.items()}
+            for hostname, future in futures.items():
+                nodes[hostname] = future.result()
+        for hostname, message in self.failed_nodes.items():
+            nodes[hostname] = {
+                "result": {
+                    "status": "failed",
+                    "message": message
+                },
+                "elapsed": 0
+            }
+        # Some methods return None on success, only a dictionary with status failed is a failure.
+        failed = [hostname for hostname, node in nodes.items()
+                  if isinstance(node["result"], dict) and node["result"].get("status") == "failed"]
+        return {
+            "status": "failed" if failed else "success",
+            "failed_nodes": failed,
+            "nodes": nodes,
+            "elapsed": time.monotonic() - start
+        }
+
+    def create_project_dir(self, **kwargs):
+        return self.run("create_project_dir", **kwargs)
+
+    def remove_project_dir(self, **kwargs):
+        return self.run("remove_project_dir", **kwargs)
+
+    def upload(self, src_path: str = HOME_PATH, src_filename: str = None, dst_filename: str = None,
+               dst_path: str = None, stream_hash: bool = False):
+        """
+        LinuxSSH.upload on every node, the file is hashed once here instead of once per node, so the .sha256 file
+        next to the source is written once, and one progress bar covers the uploads of all the nodes.
+        """
+        local_path = os.path.join(src_path, src_filename) if src_filename is not None else src_path
+        remote_path = f"{dst_path}/{dst_filename}"
+        with TransferTelemetry() as telemetry:
+            if stream_hash:
+                return self.run("_upload_stream_hash", local_path=local_path, remote_path=remote_path,
+                                dst_path=dst_path, telemetry=telemetry)
+            digest_filename = get_file_hash(base_path=src_path, filename=src_filename)
+            return self.run("_upload_with_digest", local_path=local_path, remote_path=remote_path,
+                            dst_path=dst_path, digest_abs_path=os.path.join(src_path, digest_filename),
+                            remote_digest_path=f"{dst_path}/{digest_filename}", telemetry=telemetry)
+
+    def upload_tree(self, **kwargs):
+        return self.run("upload_tree", **kwargs)
+
+    def sync_project_dir(self, **kwargs):
+        """
+        LinuxSSH.sync_project_dir on every node, the local directory is walked and hashed once here.
+        """
+        if kwargs.get("src_path") is not None and kwargs.get("local") is None:
+            try:
+                kwargs["local"] = local_manifest(kwargs["src_path"])
+            except OSError as OE:
+                return {
+                    "status": "failed",
+                    "message": str(OE)
+                }
+        return self.run("sync_project_dir", **kwargs)
+
+    def run_batch(self, **kwargs):
+        return self.run("run_batch", **kwargs)
+
+    def close(self):
+        if self.pool is not None:
+            # The sessions belong to the pool.
+            return
+        for node in self.nodes.values():
+            node.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SSHPool:
+    """
+    Authenticated ssh sessions keyed by (hostname, port, username). A session is only made when it is first asked
+    for, keepalive packets keep it open, and its health is checked before it is lent out, a stale session is
+    replaced by a new session transparently. A paramiko transport carries many channels, so one session is shared
+    by every thread asking for the same key.
+    A key belongs to the password it was first made with, asking for the key with another password fails instead of
+    lending a session authenticated, and running sudo, with the first password.
+    """
+    def __init__(self, keepalive: int = 30, log_file: str = None, level: int = None):
+        self.keepalive = keepalive
+        self.log_file = log_file
+        self.level = level
+        self._lock = Lock()
+        self._key_locks = dict()
+        self._sessions = dict()
+        # session id to the number of threads inside pool.session() with it, a borrowed session is never closed.
+        self._borrowed = dict()
+        self.stats = {
+            "connects": 0,
+            "reconnects": 0,
+            "reuses": 0
+        }
+
+    def get(self, hostname: str = "127.0.0.1", username: str = None, password: str = None,
+            port: int = 22) -> Union[LinuxSSH, Dict[str, str]]:
+        """
+        Lend a healthy session.
+        :return:
+            LinuxSSH instance, or a dictionary of response with status failed if it cannot connect.
+        """
+        key = (hostname, port, username)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+        # Only the threads asking for the same key wait for each other.
+        with key_lock:
+            session = self._sessions.get(key)
+            if session is not None and not hmac.compare_digest(str(session.password), str(password)):
+                return {
+                    "status": "failed",
+                    "message": f"{username}@{hostname}:{port} is already in the pool with another password."
+                }
+            if session is not None and session.is_healthy():
+                with self._lock:
+                    self.stats["reuses"] += 1
+                return session
+            if session is not None:
+                # never reconnected in place, a thread still using the stale session keeps its own object.
+                self._retire(session)
+            reconnect = session is not None
+            session = LinuxSSH(username=username, password=password, hostname=hostname, port=port,
+                               log_file=self.log_file, level=self.level, lazy=True, keepalive=self.keepalive)
+            response = session.ensure_connected()
+            if response["status"] != "success":
+                # the next call connects from scratch, it is a connect and not a reconnect.
+                self._sessions.pop(key, None)
+                session.close()
+                return response
+            self._sessions[key] = session
+            with self._lock:
+                self.stats["reconnects" if reconnect else "connects"] += 1
+            return session
+
+    def _retire(self, session: LinuxSSH):
+        with self._lock:
+            borrowed = self._borrowed.get(id(session), 0)
+        if not borrowed:
+            session.close()
+
+    @contextmanager
+    def session(self, hostname: str = "127.0.0.1", username: str = None, password: str = None, port: int = 22):
+        """
+        with pool.session(...) as linux: the session is not closed at the end, it stays in the pool, and it is not
+        closed by the pool while the with block is running.
+        Raises SSHException if it cannot connect.
+        """
+        session = self.get(hostname=hostname, username=username, password=password, port=port)
+        if not isinstance(session, LinuxSSH):
+            raise SSHException(session["message"])
+        with self._lock:
+            self._borrowed[id(session)] = self._borrowed.get(id(session), 0) + 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._borrowed[id(session)] -= 1
+                if self._borrowed[id(session)] == 0:
+                    del self._borrowed[id(session)]
+                    # replaced while it was borrowed, the last borrower closes it.
+                    retired = session not in self._sessions.values()
+                else:
+                    retired = False
+            if retired:
+                session.close()
+
+    def keys(self) -> List[Tuple[str, int, str]]:
+        with self._lock:
+            return list(self._sessions)
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,3 +1,9 @@
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict
+import json
+import sys
+import time
+
 from tqdm import tqdm
 """
 References to use tqdm with paramiko:
@@ -18,3 +24,171 @@ def progress_bar(*args, **kwargs):
         pbar.update(int(transferred - last[0]))  # transferred subtract from last block transferred
         last[0] = transferred  # update last block transferred
     return progress_wrapper, pbar
+
+
+class TransferTelemetry:
+    """
+    Aggregated progress of many simultaneous transfers.
+    The paramiko callback of each transfer only stores two integers, nothing is drawn and no lock is taken, a
+    reporter thread reads all transfers at a throttled interval and reports the total bytes, throughput, ETA and
+    per file progress, either on one tqdm bar or as structured metrics for non interactive services (headless).
+    The reporter starts with the first transfer if start was not called, so a telemetry shared by long lived sessions
+    only needs close. A finished transfer is reported once more and then only counted in the totals, so a telemetry
+    shared by a service does not keep every file it ever transferred.
+    """
+    def __init__(self, interval: float = 0.5, headless: bool = False,
+                 emit: Callable[[Dict[str, Any]], Any] = None, **kwargs):
+        """
+        :param interval:
+            seconds between reports.
+        :param headless:
+            if True no bar is drawn, every report is passed to emit.
+        :param emit:
+            func(dict) which receives the metrics in headless mode, default writes one json line to stderr.
+        :param kwargs:
+            passed to tqdm.
+        """
+        self.interval = interval
+        self.headless = headless
+        self.emit = emit if emit is not None else self._emit_json
+        self.tqdm_kwargs = dict(unit="B", unit_scale=True)
+        self.tqdm_kwargs.update(kwargs)
+        # name -> [transferred, total], each list is written by one transfer only.
+        self._transfers = dict()
+        self._lock = Lock()
+        self._start_lock = Lock()
+        # bytes and number of the transfers which are finished and no longer listed.
+        self._finished_bytes = 0
+        self._finished = 0
+        self._stop = Event()
+        self._thread = None
+        self._pbar = None
+        self._start = None
+        self._last = (0.0, 0)
+        self._throughput = 0.0
+
+    def callback(self, name: str, total: int = 0) -> Callable[[int, int], None]:
+        """
+        Register a transfer and return its callback, the callback has the format of paramiko func(int, int).
+        :param name:
+            name of the transfer, usually the file path, a name already used gets a suffix.
+        :param total:
+            expected bytes, the callback updates it with the total reported by paramiko.
+        """
+        slot = [0, int(total)]
+        with self._lock:
+            unique_name = name
+            suffix = 1
+            while unique_name in self._transfers:
+                suffix += 1
+                unique_name = f"{name} ({suffix})"
+            self._transfers[unique_name] = slot
+        if self._thread is None:
+            self.start()
+
+        def progress(transferred: int, to_be_transferred: int):
+            slot[0] = transferred
+            slot[1] = to_be_transferred
+        return progress
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Metrics of all transfers at this moment.
+        :return:
+            dictionary of bytes, total, throughput (bytes per second), eta (seconds), elapsed, files which are not yet
+            pruned and finished, the number of the pruned files.
+        """
+        with self._lock:
+            transfers = {name: (slot[0], slot[1]) for name, slot in self._transfers.items()}
+            finished_bytes, finished = self._finished_bytes, self._finished
+        now = time.monotonic()
+        transferred = finished_bytes + sum(done for done, _ in transfers.values())
+        total = finished_bytes + sum(size for _, size in transfers.values())
+        last_time, last_bytes = self._last
+        if now > last_time and last_time > 0:
+            rate = (transferred - last_bytes) / (now - last_time)
+            # Smooth the throughput, so one slow interval does not swing the ETA.
+            self._throughput = rate if self._throughput == 0 else 0.3 * rate + 0.7 * self._throughput
+        self._last = (now, transferred)
+        remaining = max(total - transferred, 0)
+        return {
+            "bytes": transferred,
+            "total": total,
+            "throughput": self._throughput,
+            "eta": remaining / self._throughput if self._throughput > 0 else None,
+            "elapsed": now - self._start if self._start is not None else 0.0,
+            "finished": finished,
+            "files": {
+                name: {
+                    "bytes": done,
+                    "total": size,
+                    "done": size > 0 and done >= size
+                } for name, (done, size) in transfers.items()
+            }
+        }
+
+    @staticmethod
+    def _emit_json(metrics: Dict[str, Any]):
+        sys.stderr.write(json.dumps(metrics) + "\n")
+        sys.stderr.flush()
+
+    def _report(self):
+        metrics = self.snapshot()
+        if self.headless:
+            self.emit(metrics)
+        else:
+            self._pbar.total = metrics["total"]
+            self._pbar.n = metrics["bytes"]
+            finished = metrics["finished"] + sum(1 for transfer in metrics["files"].values() if transfer["done"])
+            self._pbar.set_postfix_str(f"files {finished}/{metrics['finished'] + len(metrics['files'])}",
+                                       refresh=False)
+            self._pbar.refresh()
+        self._prune([name for name, transfer in metrics["files"].items() if transfer["done"]])
+
+    def _prune(self, names):
+        """
+        Drop the transfers which were reported as done, their bytes stay in the totals.
+        """
+        with self._lock:
+            for name in names:
+                slot = self._transfers.pop(name)
+                self._finished_bytes += slot[1]
+                self._finished += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._report()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return self
+            self._start = time.monotonic()
+            self._last = (self._start, 0)
+            self._stop.clear()
+            if not self.headless:
+                self._pbar = tqdm(**self.tqdm_kwargs)
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+            return self
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Stop the reporter, the final metrics are reported once more and returned.
+        """
+        with self._start_lock:
+            if self._thread is None:
+                return self.snapshot()
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self._report()
+        if self._pbar is not None:
+            self._pbar.close()
+        return self.snapshot()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,83 @@
+"""
+Single flight, concurrent calls with the same key share one call and its result.
+When many threads ask Ansible AWX for the same thing at the same moment, such as the organization list or the same
+job template, only the first thread sends the GET, the others wait for it and get its decoded result.
+Nothing is cached after the call is done, a call which starts later sends its own GET.
+"""
+from copy import deepcopy
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        # copy of the result taken before done is set, the waiters copy it while the leader may change its result.
+        self.snapshot = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = dict()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any], copy: bool = True,
+           timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run fn unless a call with the same key is in flight, then wait for that call instead.
+        :param key:
+            identity of the call, such as the url and its query string.
+        :param fn:
+            the call.
+        :param copy:
+            give the waiting callers a deep copy of the result, so the callers never see each other's changes
+            to the result. Use False for results which are not changed by the callers, such as a Response.
+        :param timeout:
+            seconds a waiting caller waits for the call in flight, TimeoutError is raised after that. The call
+            itself is not stopped, the caller which runs fn is bounded by fn only.
+        :return:
+            result and whether it was shared.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                    # no waiter can join once the call is popped.
+                    waiters = call.waiters
+                if copy and waiters and call.error is None:
+                    call.snapshot = deepcopy(call.result)
+                call.done.set()
+            return call.result, False
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"The call in flight for {key} is not done after {timeout} seconds.")
+        if call.error is not None:
+            raise call.error
+        return deepcopy(call.snapshot) if copy else call.result, True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.shared,
+                "in_flight": len(self._calls)
+            }
@@ -0,0 +1,99 @@
+"""
+Lock striped dictionary for the caches of Tower which are shared by many worker threads.
+The keys are spread over several shards, each shard has its own lock, so 64 threads reading and writing the cache
+rarely wait for each other, and a compound operation such as setdefault is atomic.
+With maxsize the dictionary is a least recently used cache, each shard drops its oldest keys beyond its share of
+maxsize, so a cache of a long running process such as the daemon of the cli does not grow forever.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Iterator, List, Tuple
+
+# Number of shards, a power of two larger than the usual number of worker threads.
+STRIPES = 64
+
+
+class StripedDict:
+    def __init__(self, stripes: int = STRIPES, maxsize: int = None):
+        """
+        :param maxsize:
+            approximate maximum number of keys, None for no limit.
+        """
+        self._stripes = stripes
+        self._shard_size = None if maxsize is None else max(1, maxsize // stripes)
+        self._locks = [Lock() for _ in range(stripes)]
+        self._shards = [OrderedDict() for _ in range(stripes)]
+
+    def _index(self, key: Hashable) -> int:
+        return hash(key) % self._stripes
+
+    def _used(self, shard: OrderedDict, key: Hashable):
+        # called with the lock of the shard held.
+        if self._shard_size is None:
+            return
+        shard.move_to_end(key)
+        while len(shard) > self._shard_size:
+            shard.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        index = self._index(key)
+        with self._locks[index]:
+            shard = self._shards[index]
+            if key not in shard:
+                return default
+            self._used(shard, key)
+            return shard[key]
+
+    def __getitem__(self, key: Hashable) -> Any:
+        index = self._index(key)
+        with self._locks[index]:
+            shard = self._shards[index]
+            value = shard[key]
+            self._used(shard, key)
+            return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        index = self._index(key)
+        with self._locks[index]:
+            shard = self._shards[index]
+            shard[key] = value
+            self._used(shard, key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        index = self._index(key)
+        with self._locks[index]:
+            return key in self._shards[index]
+
+    def setdefault(self, key: Hashable, value: Any) -> Any:
+        index = self._index(key)
+        with self._locks[index]:
+            shard = self._shards[index]
+            value = shard.setdefault(key, value)
+            self._used(shard, key)
+            return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].pop(key, default)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """
+        Snapshot of the items, one shard at a time, it is safe to change the dictionary while using the snapshot.
+        """
+        snapshot = list()
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                snapshot.extend(shard.items())
+        return snapshot
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter([key for key, _ in self.items()])
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def clear(self):
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                shard.clear()
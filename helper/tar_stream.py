@@ -0,0 +1,176 @@
+"""
+Bulk transfer of a directory as one compressed tar stream over one ssh channel.
+A playbook repository has thousands of small files, opening and closing each of them with sftp costs round trips,
+streaming a tar of the whole directory costs one channel. The tar entries are owned by awx:awx so the files are
+extracted by root with the right owner, no separate chown is required.
+"""
+from typing import Dict, Any
+from uuid import uuid4
+import os
+import shlex
+import tarfile
+import time
+
+# Ownership of the files extracted in the project directory.
+AWX_OWNER = "awx"
+
+
+class CountingWriter:
+    """
+    File like object which writes to the ssh channel and counts the bytes sent.
+    """
+    def __init__(self, channel_file):
+        self.channel_file = channel_file
+        self.bytes = 0
+
+    def write(self, data: bytes) -> int:
+        self.channel_file.write(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def flush(self):
+        self.channel_file.flush()
+
+
+class CountingReader:
+    """
+    File like object which reads from the ssh channel and counts the bytes received.
+    """
+    def __init__(self, channel_file):
+        self.channel_file = channel_file
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.channel_file.read(size)
+        self.bytes += len(data)
+        return data
+
+
+def _inside(root: str, path: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+def _rates(result: Dict[str, Any], start: float) -> Dict[str, Any]:
+    elapsed = time.monotonic() - start
+    result.update(
+        {
+            "elapsed": elapsed,
+            "bytes_per_sec": result["bytes"] / elapsed if elapsed > 0 else 0,
+            "files_per_sec": result["files"] / elapsed if elapsed > 0 else 0
+        }
+    )
+    return result
+
+
+def upload_tree(ssh, src_path: str, remote_root: str, compress: bool = True) -> Dict[str, Any]:
+    """
+    Stream a tar of src_path to the remote server and extract it into remote_root as awx:awx.
+    :param ssh:
+        LinuxSSH instance.
+    :param src_path:
+        local directory.
+    :param remote_root:
+        absolute path of the remote directory, created if it does not exist.
+    :param compress:
+        gzip the stream.
+    :return:
+        dictionary of files, raw bytes, bytes sent over the channel and the rates.
+    """
+    start = time.monotonic()
+    # The sudo password is followed by a sentinel line, everything up to and including the sentinel is discarded
+    # by the remote shell, then tar reads the stream. This works whether or not sudo asks for the password.
+    sentinel = uuid4().hex
+    path = shlex.quote(remote_root)
+    script = (f"while IFS= read -r line; do [ \"$line\" = {sentinel} ] && break; done; "
+              f"mkdir -p {path} && tar -x{'z' if compress else ''}f - -C {path}")
+    stdin, stdout, stderr = ssh.exec_command(f"sudo -S -p '' bash -c {shlex.quote(script)}")
+    stdin.write(f"{ssh.password}\n{sentinel}\n")
+    stdin.flush()
+    writer = CountingWriter(stdin)
+    result = {
+        "files": 0,
+        "bytes": 0
+    }
+
+    def owned_by_awx(tarinfo: tarfile.TarInfo) -> tarfile.TarInfo:
+        tarinfo.uname = tarinfo.gname = AWX_OWNER
+        if tarinfo.isfile():
+            result["files"] += 1
+            result["bytes"] += tarinfo.size
+        return tarinfo
+
+    with tarfile.open(fileobj=writer, mode="w|gz" if compress else "w|") as tar:
+        # "." is the remote_root itself, so its owner is also awx.
+        tar.add(src_path, arcname=".", filter=owned_by_awx)
+    stdin.channel.shutdown_write()
+    exit_status = stdout.channel.recv_exit_status()
+    if exit_status != 0:
+        return {
+            "status": "failed",
+            "message": stderr.read().decode("utf-8", errors="replace").strip()
+        }
+    result.update({"status": "success", "sent": writer.bytes})
+    return _rates(result, start)
+
+
+def download_tree(ssh, remote_root: str, dst_path: str, compress: bool = True) -> Dict[str, Any]:
+    """
+    Stream a tar of remote_root from the remote server and extract it into dst_path.
+    :param ssh:
+        LinuxSSH instance.
+    :param remote_root:
+        absolute path of the remote directory.
+    :param dst_path:
+        local directory, created if it does not exist.
+    :param compress:
+        gzip the stream.
+    :return:
+        dictionary of files, raw bytes, bytes received over the channel and the rates. symlinks lists the symbolic
+        links recreated, such as the links between the roles of a playbook repository, skipped lists the entries
+        which are not extracted: links which point outside of dst_path, hard links and device files.
+    """
+    start = time.monotonic()
+    command = f"tar -c{'z' if compress else ''}f - -C {shlex.quote(remote_root)} ."
+    stdin, stdout, stderr = ssh.exec_command(f"sudo -S -p '' {command}")
+    stdin.write(f"{ssh.password}\n")
+    stdin.flush()
+    reader = CountingReader(stdout)
+    result = {
+        "files": 0,
+        "bytes": 0,
+        "symlinks": list(),
+        "skipped": list()
+    }
+    os.makedirs(dst_path, exist_ok=True)
+    root = os.path.realpath(dst_path)
+    with tarfile.open(fileobj=reader, mode="r|gz" if compress else "r|") as tar:
+        for member in tar:
+            # Never extract outside of dst_path, and never create device files.
+            link_dir = os.path.realpath(os.path.join(root, os.path.dirname(member.name)))
+            # a link replaces what is at its path, so its own path is not followed.
+            target = os.path.join(link_dir, os.path.basename(member.name)) if member.issym() else \
+                os.path.realpath(os.path.join(root, member.name))
+            if not _inside(root, target):
+                result["skipped"].append(member.name)
+                continue
+            if member.issym():
+                # a link is only recreated if what it points to is also inside dst_path.
+                if not _inside(root, os.path.realpath(os.path.join(link_dir, member.linkname))):
+                    result["skipped"].append(member.name)
+                    continue
+                result["symlinks"].append(member.name)
+            elif member.isdev() or member.islnk():
+                result["skipped"].append(member.name)
+                continue
+            if member.isfile():
+                result["files"] += 1
+                result["bytes"] += member.size
+            tar.extract(member, root, set_attrs=member.isfile())
+    exit_status = stdout.channel.recv_exit_status()
+    if exit_status != 0:
+        return {
+            "status": "failed",
+            "message": stderr.read().decode("utf-8", errors="replace").strip()
+        }
+    result.update({"status": "success", "received": reader.bytes})
+    return _rates(result, start)